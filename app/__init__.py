@@ -33,6 +33,25 @@ def create_app(config_filename=None):
     app.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
     print(f"Supabase Client loaded in {time.time() - start_time:.3f} seconds.")
 
+    # Timeouts, circuit breaker and spill journal shared by all SkillData database calls
+    from app.services.db_resilience import DatabaseGuard
+    app.db_guard = DatabaseGuard.from_config(app.supabase, app.config, app.instance_path)
+    app.db_guard.start_replayer(app.config.get('DB_REPLAY_INTERVAL', 10.0), app.config.get('DB_REPLAY_BATCH_SIZE', 500))
+    print(f"Database guard loaded in {time.time() - start_time:.3f} seconds.")
+
+    # Cache shared by all worker processes, sized once here so a preloading master maps it before forking
+    from app.utils.shared_cache import SharedCache
+    app.shared_cache = SharedCache.from_config(app.config, app.instance_path)
+    print(f"Shared cache mapped in {time.time() - start_time:.3f} seconds.")
+
+    # Request profiling is only hooked in when PROFILING_ENABLED is set
+    from app.utils.profiler import init_profiling
+    init_profiling(app)
+
+    # Exercise recommendation index is built once per process from the catalog
+    from app.services.exercise_recommendations import ExerciseIndex
+    app.exercise_index = ExerciseIndex.from_catalog(app.config.get('EXERCISE_CATALOG_PATH'))
+    print(f"Exercise index built in {time.time() - start_time:.3f} seconds.")
 
     # Import Routes
     from app.routes import routes
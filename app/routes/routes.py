@@ -1,10 +1,16 @@
 
 import os
-from flask import Blueprint, request, jsonify, current_app
+import json
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify, current_app, abort, stream_with_context
 from dotenv import load_dotenv, find_dotenv
 from ..services.screener_processing import filter_data_by_skill, find_total_skills
 from ..services.generate_story import generate_story
+from ..services.story_engine import generate_local_story, parse_score, story_stats, target_letter_for_category, LETTER_SOUNDS
 from ..services.skill_data import SkillData  
+from ..services.irt_scoring import IRT_MODELS, add_abilities_to_scores, cached_model as cached_irt_model, start_model_refresher
+from ..services.score_export import iter_table, export_rows, EXPORT_COLUMNS, EXPORT_FORMATS
+from ..utils.admin_auth import admin_request_allowed
 import requests
 
 
@@ -12,7 +18,6 @@ load_dotenv(find_dotenv())
 
 bp = Blueprint('routes', __name__)
 
-data_store = {}
 
 @bp.route('/')
 def test_route():
@@ -24,16 +29,74 @@ def home_route():
     return "This is the home page!"
 
 
+# Stories come from gpt-4o, or from the local story engine when mode is 'fast'/'offline'
+# or when the upstream call fails or takes longer than STORY_UPSTREAM_TIMEOUT
+
+story_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="generate-story")
+
+
+def story_letter_for_user(user_id, use_database: bool) -> str | None:
+    # A cached report avoids the database, the offline modes never query it
+    cached_report = current_app.shared_cache.get(f"report:{user_id}")
+    if cached_report is not None:
+        weakest = SkillData.weakest_category_in_scores(cached_report["scores"])
+    elif use_database:
+        skill_data = SkillData(current_app.db_guard, current_app.shared_cache)
+        try:
+            skill_data.load_from_db(user_id)
+        except Exception as e:
+            current_app.logger.warning(f"Could not load scores of user {user_id}, using the default story letter: {e!r}")
+            return None
+        weakest = skill_data.weakest_category()
+    else:
+        return None
+    return target_letter_for_category(weakest[1]) if weakest is not None else None
+
+
+def story_response(story: str, source: str, target_letter: str, letter_source: str):
+    return jsonify({'story': story, 'source': source, 'letter': target_letter, 'letter_source': letter_source,
+                    'target_words': story_stats(story, target_letter)['target_words']})
+
+
 @bp.route('/generate_story', methods=['POST'])
 def generate_story_endpoint():
-        data = request.json
-        score = data.get('score')
-
-        if score is None:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'A JSON object is required'}), 400
+        if data.get('score') is None:
             return jsonify({'error': 'Score is required'}), 400
-
-        story = generate_story(score)
-        return jsonify({'story': story})
+        score = parse_score(data['score'])
+        if score is None:
+            return jsonify({'error': 'Score must be a number'}), 400
+
+        mode = data.get('mode', request.args.get('mode', current_app.config.get('STORY_MODE', 'auto')))
+        offline = mode in ('fast', 'offline')
+        target_letter = data.get('letter')
+        if target_letter and (not isinstance(target_letter, str) or target_letter.lower() not in LETTER_SOUNDS):
+            return jsonify({'error': f"Unsupported letter, use one of {sorted(LETTER_SOUNDS)}"}), 400
+        # letter_source tells the client whether the letter was asked for, picked from the weakest category or the default
+        letter_source = 'request' if target_letter else 'default'
+        if not target_letter and data.get('user_id') is not None:
+            target_letter = story_letter_for_user(data['user_id'], use_database=not offline)
+            if target_letter:
+                letter_source = 'weakest_category'
+        target_letter = (target_letter or 'r').lower()
+
+        if offline:
+            return story_response(generate_local_story(score, target_letter), 'local', target_letter, letter_source)
+
+        cache_key = f"story:{score}:{target_letter}"
+        story = current_app.shared_cache.get(cache_key)
+        if story is None:
+            try:
+                story = story_executor.submit(generate_story, score, target_letter=target_letter).result(
+                    timeout=current_app.config.get('STORY_UPSTREAM_TIMEOUT', 5.0))
+            except Exception as e:
+                # The upstream call keeps running in the background, its result is simply not used
+                current_app.logger.warning(f"Upstream story generation failed or timed out, using local story engine: {e!r}")
+                return story_response(generate_local_story(score, target_letter), 'local', target_letter, letter_source)
+            current_app.shared_cache.set(cache_key, story, current_app.config.get('STORY_CACHE_TTL', 3600))
+        return story_response(story, 'openai', target_letter, letter_source)
 
 
 @bp.route('/api_test', methods=['GET', 'POST'])
@@ -50,6 +113,17 @@ def api_test():
 
 # Receives results from webhook and processes the screener results
 
+# The IRT refresher thread is started by the first request of every worker process, after the fork,
+# so each worker has its own warm model instead of only the preloading master
+
+@bp.before_app_request
+def start_irt_refresher():
+    scoring = current_app.config.get('SCORING_MODE', 'summary')
+    if scoring in IRT_MODELS:
+        db_guard = current_app.db_guard
+        start_model_refresher(lambda: SkillData(db_guard).load_all_users_from_db(), scoring, current_app.config.get('IRT_MODEL_MAX_AGE', 3600.0) / 2)
+
+
 @bp.route('/calculate_score', methods=['GET', 'POST'])
 def calculate_score():
     if request.method == 'GET':
@@ -61,7 +135,7 @@ def calculate_score():
         current_app.logger.info(f"POST request data: {request.json}")
 
         #print(f"This is how data variable appears: {data}")
-        skill_data = SkillData()
+        skill_data = SkillData(current_app.db_guard, current_app.shared_cache)
 
         skill_data.preprocess_screener(data)
         email = skill_data.extract_email_from_webhook(data)
@@ -91,6 +165,26 @@ def calculate_score():
         skill_data.insert_scores_by_category_into_db(user_id, all_score_categories)
         skill_data.upload_all_skill_values_to_db(user_id)
 
+        # Optional IRT abilities next to total_questions/correct_answers, the stored summaries are unchanged.
+        # Only the configured SCORING_MODE is used, a request can opt out with ?scoring=summary but cannot ask for a
+        # model the deployment does not fit. The model is fitted by this worker's refresher thread, never inline.
+        scoring = current_app.config.get('SCORING_MODE', 'summary')
+        if request.args.get('scoring') == 'summary':
+            scoring = 'summary'
+        if scoring in IRT_MODELS:
+            try:
+                irt_model = cached_irt_model(scoring)
+                if irt_model is None:
+                    current_app.logger.info(f"{scoring} model is not fitted yet in this worker, returning summary scores only")
+                else:
+                    add_abilities_to_scores(all_score_categories, skill_data.data, irt_model)
+            except Exception as e:
+                # The summary scores do not need the model, so a failure only drops the abilities
+                current_app.logger.error(f"IRT scoring unavailable, returning summary scores only: {e!r}")
+
+        exercise_plan = current_app.exercise_index.recommend(all_score_categories, skill_data.data, current_app.config.get('EXERCISE_PLAN_SIZE', 5))
+        current_app.logger.info(f"Exercise Plan: {exercise_plan}")
+
        # filtered_data = filter_data_by_skill(data)
 
        # current_app.logger.info(f"Filtered Data {filtered_data}")
@@ -99,15 +193,76 @@ def calculate_score():
         #skills_score = find_total_skills(filtered_data)
         #current_app.logger.info(f"Filtered Skills {skills_score}")
         
-        return jsonify({"message": "POST request received", "This is the received data": all_score_categories})
-
-
+        if user_id is not None:
+            current_app.shared_cache.set(f"report:{user_id}", {"scores": all_score_categories, "exercise_plan": exercise_plan})
+
+        return jsonify({"message": "POST request received", "This is the received data": all_score_categories, "exercise_plan": exercise_plan})
+
+
+# Returns the latest report of a user, from the shared cache when another worker already built it.
+# Admin only, user ids are sequential and the report holds a child's scores.
+
+@bp.route('/report/<user_id>', methods=['GET'])
+def report(user_id):
+    if not admin_request_allowed('REPORT_ADMIN_TOKEN'):
+        abort(403)
+    cache_key = f"report:{user_id}"
+    cached_report = current_app.shared_cache.get(cache_key)
+    if cached_report is not None:
+        return jsonify(cached_report)
+
+    skill_data = SkillData(current_app.db_guard, current_app.shared_cache)
+    try:
+        skill_data.load_from_db(user_id)
+    except Exception as e:
+        current_app.logger.error(f"Could not load scores of user {user_id}: {e!r}")
+        return jsonify({"error": "Database unavailable"}), 503
+    if not skill_data.data:
+        abort(404)
+    all_score_categories = skill_data.calculate_score_in_all_categories()
+    exercise_plan = current_app.exercise_index.recommend(all_score_categories, skill_data.data, current_app.config.get('EXERCISE_PLAN_SIZE', 5))
+    user_report = {"scores": all_score_categories, "exercise_plan": exercise_plan}
+    current_app.shared_cache.set(cache_key, user_report)
+    return jsonify(user_report)
+
+
+# Streams the exercise plan of every user as NDJSON, one line per user, loading users batch by batch.
+# Admin only, like /export/scores. A database failure mid-stream ends the body with an export_error record.
+
+@bp.route('/exercise_plans', methods=['GET'])
+def exercise_plans():
+    if not admin_request_allowed('EXERCISE_PLANS_ADMIN_TOKEN'):
+        abort(403)
+    skill_data = SkillData(current_app.db_guard)
+    exercise_index = current_app.exercise_index
+    plan_size = current_app.config.get('EXERCISE_PLAN_SIZE', 5)
+    batch_size = current_app.config.get('EXERCISE_PLANS_BATCH_SIZE', 200)
+    logger = current_app.logger
+
+    def plan_lines():
+        users_exported, last_user_id = 0, None
+        try:
+            for user_id, plan in exercise_index.iter_recommendations(skill_data.iter_users_from_db(batch_size), plan_size):
+                yield json.dumps({"user_id": user_id, "plan": plan}, default=str) + "\n"
+                users_exported, last_user_id = users_exported + 1, user_id
+        except Exception as e:
+            logger.error(f"Exercise plans stopped after {users_exported} users, last user id {last_user_id}: {e!r}")
+            yield json.dumps({"export_error": type(e).__name__, "users_exported": users_exported, "last_user_id": last_user_id}, default=str) + "\n"
+
+    return current_app.response_class(stream_with_context(plan_lines()), mimetype='application/x-ndjson')
+
+
+
+# The store lives in a pinned shared cache slot so every worker returns the same data.
+# A payload that does not fit is rejected instead of being kept in one worker's memory.
+
+SEND_TO_JAVA_KEY = "send_to_java:data_store"
 
 @bp.route('/send_to_java', methods=['GET', 'POST'])
 def send_to_java_test():
-    global data_store
     if request.method == 'GET':
         # Handle GET request: return the stored data
+        data_store = current_app.shared_cache.get(SEND_TO_JAVA_KEY, {})
         print("Returning data:", data_store)
         response = jsonify(data_store)
         response.headers['Content-Type'] = 'application/json'
@@ -117,11 +272,85 @@ def send_to_java_test():
         # Handle POST request: update the stored data
 
         data = request.json
-        data_store = data
-        response = jsonify({"status": "success", "data": data_store})
+        if not current_app.shared_cache.set(SEND_TO_JAVA_KEY, data, ttl=0, pinned=True):
+            return jsonify({"status": "error", "error": "Payload does not fit in the shared store"}), 413
+        response = jsonify({"status": "success", "data": data})
         response.headers['Content-Type'] = 'application/json'
         return response
 
+# Streams skill_scores or category_scores as NDJSON or CSV, page by page.
+# A database failure mid-stream ends the body with an export_error record carrying the last exported id.
+
+@bp.route('/export/scores', methods=['GET'])
+def export_scores():
+    if not admin_request_allowed('EXPORT_ADMIN_TOKEN'):
+        abort(403)
+    table_name = request.args.get('table', 'category_scores')
+    export_format = request.args.get('format', 'ndjson')
+    if table_name not in EXPORT_COLUMNS or export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"table must be one of {list(EXPORT_COLUMNS)} and format one of {list(EXPORT_FORMATS)}"}), 400
+    category = request.args.get('category')
+    if category and category not in SkillData.skill_category_to_skill_category_id:
+        return jsonify({'error': f"Unknown category: {category}"}), 400
+    page_size = request.args.get('page_size', 1000, type=int)
+    max_page_size = current_app.config.get('EXPORT_MAX_PAGE_SIZE', 5000)
+    if page_size is None or not 1 <= page_size <= max_page_size:
+        return jsonify({'error': f"page_size must be between 1 and {max_page_size}"}), 400
+
+    rows = iter_table(
+        current_app.supabase,
+        table_name,
+        user_id=request.args.get('user_id'),
+        start_date=request.args.get('start_date'),
+        end_date=request.args.get('end_date'),
+        category=category,
+        page_size=page_size,
+        execute=current_app.db_guard.execute
+    )
+    response = current_app.response_class(stream_with_context(export_rows(rows, table_name, export_format)), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f"attachment; filename={table_name}.{export_format}"
+    return response
+
+# Hit statistics of this worker and of all workers sharing the cache
+
+@bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(current_app.shared_cache.stats())
+
+# Database circuit breaker state and spill journal depth
+
+@bp.route('/health/db', methods=['GET'])
+def db_health():
+    return jsonify(current_app.db_guard.status())
+
+# Admin endpoints for stored request profiles
+
+def profiles_admin_allowed() -> bool:
+    return admin_request_allowed('PROFILING_ADMIN_TOKEN')
+
+
+@bp.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    if current_app.profile_store is None:
+        abort(404)
+    if not profiles_admin_allowed():
+        abort(403)
+    return jsonify({"profiles": current_app.profile_store.list_profiles()})
+
+
+@bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    if current_app.profile_store is None:
+        abort(404)
+    if not profiles_admin_allowed():
+        abort(403)
+    profile = current_app.profile_store.get_profile(profile_id)
+    if profile is None:
+        abort(404)
+    if request.args.get('format') == 'collapsed':
+        return current_app.response_class(profile["stacks"], mimetype='text/plain')
+    return jsonify(profile)
+
 # Error Handling and configuring
 
 
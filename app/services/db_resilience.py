@@ -0,0 +1,382 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+try:
+    from httpx import TransportError
+except ImportError:
+    TransportError = ConnectionError
+
+# Resilience layer for the Supabase calls made by SkillData.
+# Every call gets a timeout and goes through a circuit breaker. Writes that cannot reach the database
+# are spilled into a local SQLite (WAL) journal, and a background replayer drains the journal in bulk
+# once the breaker lets calls through again.
+
+
+# Journal operations, each one is safe to replay more than once
+REPLAYABLE_OPERATIONS = ("insert_missing", "upsert", "update")
+
+
+# SQLSTATE classes that mean the database could not serve the call right now:
+# connection exception, transaction rollback (deadlock, serialization), insufficient resources, operator intervention
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57")
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_transient_error(error: Exception) -> bool:
+    # Timeouts, connection errors and 5xx responses trip the breaker and spill writes.
+    # Everything else (PostgREST 4xx such as a bad column or a constraint violation, plain bugs) fails the
+    # same way on every retry, so it is raised to the caller instead.
+    if isinstance(error, (CircuitOpenError, TimeoutError, FutureTimeoutError, ConnectionError, TransportError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    code = str(getattr(error, "code", None) or status or "")
+    if len(code) == 3 and code.isdigit():
+        return code.startswith("5")
+    # PGRST000-PGRST003: PostgREST could not connect to the database or get a pooled connection in time
+    return code.startswith("PGRST00") or (len(code) == 5 and code[:2] in TRANSIENT_SQLSTATE_CLASSES)
+
+
+class CircuitBreaker:
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.state: str = CircuitBreaker.CLOSED
+        self.failures: int = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight: bool = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == CircuitBreaker.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = CircuitBreaker.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CircuitBreaker.CLOSED:
+                return True
+            if self.state == CircuitBreaker.HALF_OPEN and not self._trial_in_flight:
+                # Only one trial call is let through until it succeeds or fails
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def can_attempt(self) -> bool:
+        # Same answer as allow_request() but without reserving the half-open trial call
+        with self._lock:
+            if self.state == CircuitBreaker.OPEN:
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            return self.state == CircuitBreaker.CLOSED or not self._trial_in_flight
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CircuitBreaker.CLOSED:
+                logging.info("Circuit breaker closed, database calls succeed again")
+            self.state = CircuitBreaker.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        # The call ended without telling anything about the database, so the state stays as it is
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != CircuitBreaker.OPEN:
+                    logging.warning(f"Circuit breaker opened after {self.failures} failures")
+                self.state = CircuitBreaker.OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def status(self) -> dict[str, any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "open_for_seconds": round(time.monotonic() - self.opened_at, 3) if self.opened_at is not None else None
+            }
+
+
+class SpillJournal:
+
+    # Append-only journal of writes that could not be sent to Supabase.
+    # Entries are claimed with a lease before they are replayed, so several worker processes
+    # can share one journal file without replaying the same entry twice.
+
+    def __init__(self, path: str, lease_seconds: float = 60.0, max_attempts: int = 10):
+        self.path: str = path
+        self.lease_seconds: float = lease_seconds
+        self.max_attempts: int = max_attempts
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    operation TEXT NOT NULL,
+                    rows TEXT NOT NULL,
+                    key_columns TEXT,
+                    user_email TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    claimed_by TEXT,
+                    claimed_at REAL,
+                    created_at REAL NOT NULL
+                )
+            """)
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def append(self, table_name: str, operation: str, rows: list[dict[str, any]], key_columns: str = None, user_email: str = None) -> None:
+        connection = self._connect()
+        try:
+            connection.execute(
+                "INSERT INTO journal (table_name, operation, rows, key_columns, user_email, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (table_name, operation, json.dumps(rows), key_columns, user_email, time.time())
+            )
+        finally:
+            connection.close()
+        logging.warning(f"Spilled {operation} of {len(rows)} rows into '{table_name}' to the local journal")
+
+    def claim(self, limit: int) -> tuple[str, list[dict[str, any]]]:
+        claim_id = uuid.uuid4().hex
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("""
+                UPDATE journal SET claimed_by = ?, claimed_at = ?
+                WHERE id IN (
+                    SELECT id FROM journal
+                    WHERE (claimed_by IS NULL OR claimed_at < ?) AND attempts < ?
+                    ORDER BY id LIMIT ?
+                )
+            """, (claim_id, now, now - self.lease_seconds, self.max_attempts, limit))
+            connection.execute("COMMIT")
+            cursor = connection.execute(
+                "SELECT id, table_name, operation, rows, key_columns, user_email FROM journal WHERE claimed_by = ? ORDER BY id",
+                (claim_id,)
+            )
+            entries = [
+                {
+                    "id": entry_id,
+                    "table_name": table_name,
+                    "operation": operation,
+                    "rows": json.loads(rows),
+                    "key_columns": key_columns,
+                    "user_email": user_email
+                }
+                for entry_id, table_name, operation, rows, key_columns, user_email in cursor.fetchall()
+            ]
+        finally:
+            connection.close()
+        return claim_id, entries
+
+    def complete(self, entry_ids: list[int]) -> None:
+        if not entry_ids:
+            return
+        connection = self._connect()
+        try:
+            connection.executemany("DELETE FROM journal WHERE id = ?", [(entry_id,) for entry_id in entry_ids])
+        finally:
+            connection.close()
+
+    def release(self, claim_id: str, failed_ids: list[int] = ()) -> None:
+        connection = self._connect()
+        try:
+            connection.executemany("UPDATE journal SET attempts = attempts + 1 WHERE id = ?", [(entry_id,) for entry_id in failed_ids])
+            connection.execute("UPDATE journal SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?", (claim_id,))
+        finally:
+            connection.close()
+
+    def depth(self) -> dict[str, int]:
+        connection = self._connect()
+        try:
+            pending, dead = connection.execute(
+                "SELECT COALESCE(SUM(attempts < ?), 0), COALESCE(SUM(attempts >= ?), 0) FROM journal",
+                (self.max_attempts, self.max_attempts)
+            ).fetchone()
+        finally:
+            connection.close()
+        return {"pending": pending, "dead": dead}
+
+
+class DatabaseGuard:
+
+    def __init__(self, supabase, breaker: CircuitBreaker, journal: SpillJournal, call_timeout: float = 5.0, max_workers: int = 8):
+        self.supabase = supabase
+        self.breaker: CircuitBreaker = breaker
+        self.journal: SpillJournal = journal
+        self.call_timeout: float = call_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase-call")
+        self._replayer: threading.Thread | None = None
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def from_config(cls, supabase, config, instance_path: str) -> "DatabaseGuard":
+        breaker = CircuitBreaker(config.get('DB_BREAKER_FAILURE_THRESHOLD', 5), config.get('DB_BREAKER_RESET_TIMEOUT', 30.0))
+        journal = SpillJournal(config.get('DB_JOURNAL_PATH') or os.path.join(instance_path, 'spill_journal.sqlite3'), max_attempts=config.get('DB_JOURNAL_MAX_ATTEMPTS', 10))
+        return cls(supabase, breaker, journal, config.get('DB_CALL_TIMEOUT', 5.0))
+
+    def execute(self, query):
+        # Runs query.execute() with a timeout, raises CircuitOpenError when the breaker is open
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Database circuit breaker is open")
+        try:
+            response = self._executor.submit(query.execute).result(timeout=self.call_timeout)
+        except Exception as e:
+            logging.error(f"Database call failed: {e!r}")
+            if is_transient_error(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_trial()
+            raise
+        self.breaker.record_success()
+        return response
+
+    def write(self, table_name: str, operation: str, rows: list[dict[str, any]], query=None, key_columns: str = None, user_email: str = None):
+        # Executes the write, or spills rows into the journal when the database is unavailable.
+        # Returns None when the write was spilled, errors that are not transient are raised.
+        # A timed-out call may still commit later, so only operations that are safe to replay twice are spilled:
+        # insert_missing and upsert check key_columns on replay, update sets the same values again.
+        if operation not in REPLAYABLE_OPERATIONS:
+            raise ValueError(f"Operation '{operation}' cannot be replayed safely, use one of {REPLAYABLE_OPERATIONS}")
+        if operation != "update" and not key_columns:
+            raise ValueError(f"Operation '{operation}' needs key_columns to find rows that already exist")
+        if query is not None:
+            try:
+                return self.execute(query)
+            except Exception as e:
+                # Rows that were rejected would be rejected again on every replay, so only outages are spilled
+                if not is_transient_error(e):
+                    raise
+        self.journal.append(table_name, operation, rows, key_columns, user_email)
+        return None
+
+    def replay(self, batch_size: int = 500) -> int:
+        claim_id, entries = self.journal.claim(batch_size)
+        if not entries:
+            return 0
+
+        replayed_ids: list[int] = []
+        user_ids_by_email: dict[str, any] = {}
+        position = 0
+        try:
+            while position < len(entries):
+                # Consecutive entries of the same kind are replayed together, missing rows go out as one bulk insert
+                group = [entries[position]]
+                while position + len(group) < len(entries) and self._same_kind(group[0], entries[position + len(group)]):
+                    group.append(entries[position + len(group)])
+
+                rows = []
+                for entry in group:
+                    rows.extend(self._resolve_user_ids(entry, user_ids_by_email))
+                self._replay_rows(group[0], rows)
+                replayed_ids.extend(entry["id"] for entry in group)
+                position += len(group)
+        except Exception as e:
+            logging.error(f"Journal replay stopped after {len(replayed_ids)} entries: {e!r}")
+            self.journal.complete(replayed_ids)
+            # An open breaker says nothing about the entry itself, so it does not count as an attempt
+            failed_ids = [] if isinstance(e, CircuitOpenError) else [entries[position]["id"]]
+            self.journal.release(claim_id, failed_ids)
+            return len(replayed_ids)
+
+        self.journal.complete(replayed_ids)
+        logging.info(f"Replayed {len(replayed_ids)} journal entries")
+        return len(replayed_ids)
+
+    def _same_kind(self, first: dict[str, any], second: dict[str, any]) -> bool:
+        return (first["table_name"], first["operation"], first["key_columns"]) == (second["table_name"], second["operation"], second["key_columns"]) \
+            and first["operation"] != "update"
+
+    def _resolve_user_ids(self, entry: dict[str, any], user_ids_by_email: dict[str, any]) -> list[dict[str, any]]:
+        # Rows written while the user itself could not be created carry the email instead of a user_id
+        email = entry["user_email"]
+        if not email or not any("user_id" in row and row["user_id"] is None for row in entry["rows"]):
+            return entry["rows"]
+        if email not in user_ids_by_email:
+            query = self.supabase.from_("users").select("user_id").eq("email", email).order("user_id", desc=True).limit(1)
+            response = self.execute(query)
+            if not response.data:
+                raise LookupError(f"User for {email} has not been created yet")
+            user_ids_by_email[email] = response.data[0]["user_id"]
+        return [dict(row, user_id=user_ids_by_email[email]) if row.get("user_id") is None else row for row in entry["rows"]]
+
+    def _replay_rows(self, entry: dict[str, any], rows: list[dict[str, any]]) -> None:
+        table_name = entry["table_name"]
+        if entry["operation"] == "update":
+            for row in rows:
+                self.execute(self.supabase.from_(table_name).update(row["values"]).match(row["match"]))
+            return
+        if entry["operation"] not in REPLAYABLE_OPERATIONS:
+            raise ValueError(f"Unknown journal operation: {entry['operation']}")
+
+        # Rows are looked up by their key first, so a write that already landed (e.g. after a timeout) is not
+        # inserted twice. This mirrors the select -> update/insert path in SkillData.upsert_skill_value and does
+        # not rely on a unique constraint. Rows that are still missing are inserted with one bulk call.
+        key_columns = entry["key_columns"].split(",")
+        missing_rows: dict[tuple, dict[str, any]] = {}
+        for row in rows:
+            key = {column: row[column] for column in key_columns}
+            key_values = tuple(key.values())
+            if key_values in missing_rows:
+                if entry["operation"] == "upsert":
+                    missing_rows[key_values] = row
+                continue
+            existing = self.execute(self.supabase.from_(table_name).select(key_columns[0]).match(key).limit(1))
+            if not existing.data:
+                missing_rows[key_values] = row
+            elif entry["operation"] == "upsert":
+                self.execute(self.supabase.from_(table_name).update(row).match(key))
+        if missing_rows:
+            self.execute(self.supabase.from_(table_name).insert(list(missing_rows.values())))
+
+    def start_replayer(self, interval: float = 10.0, batch_size: int = 500) -> None:
+        if self._replayer is not None:
+            return
+
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    if self.journal.depth()["pending"] and self.breaker.can_attempt():
+                        while self.replay(batch_size) == batch_size:
+                            pass
+                except Exception as e:
+                    logging.error(f"Journal replayer error: {e!r}")
+
+        self._replayer = threading.Thread(target=run, name="journal-replayer", daemon=True)
+        self._replayer.start()
+
+    def stop_replayer(self) -> None:
+        self._stop_event.set()
+
+    def status(self) -> dict[str, any]:
+        return {
+            "breaker": self.breaker.status(),
+            "journal_depth": self.journal.depth()
+        }
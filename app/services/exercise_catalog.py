@@ -0,0 +1,148 @@
+# Default exercise catalog used by the recommendation index.
+# Every exercise is tagged with the domain and category it practices and the screener skill ids
+# (lowercase, the same ids SkillData.preprocess_screener stores) that it directly targets.
+# A different catalog can be loaded from a JSON file with the same fields through EXERCISE_CATALOG_PATH.
+
+EXERCISE_CATALOG: list[dict[str, any]] = [
+    # Phonological Awareness
+    {
+        "exercise_id": "phaw-rhyme-basket",
+        "title": "Rhyme Basket",
+        "description": "Pick toys from a basket and find another toy whose name rhymes with it.",
+        "domain": "language_and_literacy",
+        "category": "phonological_awareness",
+        "skills": ["phaw1", "phaw2"],
+        "minutes": 10
+    },
+    {
+        "exercise_id": "phaw-clap-syllables",
+        "title": "Clap the Syllables",
+        "description": "Say family names out loud and clap once for every syllable.",
+        "domain": "language_and_literacy",
+        "category": "phonological_awareness",
+        "skills": ["phaw3", "phaw4"],
+        "minutes": 5
+    },
+    {
+        "exercise_id": "phaw-first-sound-hunt",
+        "title": "First Sound Hunt",
+        "description": "Walk around the house and find things that start with the same sound.",
+        "domain": "language_and_literacy",
+        "category": "phonological_awareness",
+        "skills": ["phaw5", "phaw6"],
+        "minutes": 10
+    },
+    # Print Knowledge
+    {
+        "exercise_id": "prkn-book-tour",
+        "title": "Book Tour",
+        "description": "Let your child show you the front cover, the title and where the story starts.",
+        "domain": "language_and_literacy",
+        "category": "print_knowledge",
+        "skills": ["prkn1", "prkn2"],
+        "minutes": 5
+    },
+    {
+        "exercise_id": "prkn-finger-tracking",
+        "title": "Finger Tracking",
+        "description": "Read a short page together while your child follows the words with a finger.",
+        "domain": "language_and_literacy",
+        "category": "print_knowledge",
+        "skills": ["prkn3", "prkn4"],
+        "minutes": 10
+    },
+    {
+        "exercise_id": "prkn-sign-spotting",
+        "title": "Sign Spotting",
+        "description": "Point out signs and labels on a walk and talk about what the words say.",
+        "domain": "language_and_literacy",
+        "category": "print_knowledge",
+        "skills": ["prkn5"],
+        "minutes": 15
+    },
+    # Alphabet Knowledge
+    {
+        "exercise_id": "ak-letter-match",
+        "title": "Letter Match",
+        "description": "Match uppercase and lowercase letter cards.",
+        "domain": "language_and_literacy",
+        "category": "alphabet_knowledge",
+        "skills": ["ak1", "ak2"],
+        "minutes": 10
+    },
+    {
+        "exercise_id": "ak-name-letters",
+        "title": "Letters in My Name",
+        "description": "Build your child's name with letter magnets and say each letter.",
+        "domain": "language_and_literacy",
+        "category": "alphabet_knowledge",
+        "skills": ["ak3", "ak4"],
+        "minutes": 5
+    },
+    {
+        "exercise_id": "ak-alphabet-song",
+        "title": "Alphabet Song Pointing",
+        "description": "Sing the alphabet song while pointing to each letter on a chart.",
+        "domain": "language_and_literacy",
+        "category": "alphabet_knowledge",
+        "skills": ["ak5"],
+        "minutes": 5
+    },
+    # Comprehension
+    {
+        "exercise_id": "co-what-happens-next",
+        "title": "What Happens Next?",
+        "description": "Pause a story before the end and ask your child to guess what happens next.",
+        "domain": "language_and_literacy",
+        "category": "comprehension",
+        "skills": ["co1", "co2"],
+        "minutes": 10
+    },
+    {
+        "exercise_id": "co-story-questions",
+        "title": "Who, Where, Why",
+        "description": "After reading, ask who was in the story, where it happened and why.",
+        "domain": "language_and_literacy",
+        "category": "comprehension",
+        "skills": ["co3", "co4"],
+        "minutes": 10
+    },
+    # Text Structure
+    {
+        "exercise_id": "ts-picture-sequence",
+        "title": "Picture Sequence",
+        "description": "Put three picture cards of a story in order: beginning, middle and end.",
+        "domain": "language_and_literacy",
+        "category": "text_structure",
+        "skills": ["ts1", "ts2"],
+        "minutes": 10
+    },
+    {
+        "exercise_id": "ts-retell",
+        "title": "Retell the Story",
+        "description": "Ask your child to retell a favorite story using first, then and last.",
+        "domain": "language_and_literacy",
+        "category": "text_structure",
+        "skills": ["ts3"],
+        "minutes": 10
+    },
+    # Writing
+    {
+        "exercise_id": "wr-shape-tracing",
+        "title": "Shape Tracing",
+        "description": "Trace lines, circles and letters in sand, flour or on paper.",
+        "domain": "language_and_literacy",
+        "category": "writing",
+        "skills": ["wr1", "wr2"],
+        "minutes": 10
+    },
+    {
+        "exercise_id": "wr-grocery-list",
+        "title": "Grocery List Helper",
+        "description": "Let your child 'write' items on the grocery list with drawings and letters.",
+        "domain": "language_and_literacy",
+        "category": "writing",
+        "skills": ["wr3", "wr4"],
+        "minutes": 10
+    }
+]
@@ -0,0 +1,93 @@
+import json
+import logging
+from .exercise_catalog import EXERCISE_CATALOG
+
+# Builds exercise plans from screener results without any network call.
+# The catalog is turned once into an inverted index (category -> exercises, skill id -> exercises)
+# so a plan only touches the exercises that match a child's gaps.
+
+
+class ExerciseIndex:
+
+    # Weight added for every missed skill an exercise targets directly.
+    # Exercises that only match the category are ranked by how big the category gap is (0 to 1).
+    missed_skill_weight: float = 1.0
+
+    def __init__(self, exercises: list[dict[str, any]]):
+        self.exercises: list[dict[str, any]] = exercises
+        self.by_category: dict[tuple[str, str], list[int]] = {}
+        self.by_skill: dict[str, list[int]] = {}
+
+        for position, exercise in enumerate(exercises):
+            category_key = (exercise["domain"], exercise["category"])
+            self.by_category.setdefault(category_key, []).append(position)
+            for skill_name_id in exercise.get("skills", []):
+                self.by_skill.setdefault(skill_name_id.lower(), []).append(position)
+
+        logging.info(f"Exercise index built with {len(exercises)} exercises, {len(self.by_category)} categories and {len(self.by_skill)} skills")
+
+    @classmethod
+    def from_catalog(cls, catalog_path: str = None) -> "ExerciseIndex":
+        if not catalog_path:
+            return cls(EXERCISE_CATALOG)
+        with open(catalog_path) as f:
+            return cls(json.load(f))
+
+    def recommend(self, scores: dict[str, dict[str, dict[str, int]]], skill_values: dict[str, dict[str, dict[str, int]]], limit: int = 5) -> list[dict[str, any]]:
+        # scores is the output of SkillData.calculate_score_in_all_categories, skill_values is SkillData.data
+        weights: dict[int, float] = {}
+        targets: dict[int, list[str]] = {}
+
+        for domain, categories in scores.items():
+            for category, summary in categories.items():
+                total_questions = summary["total_questions"]
+                if not total_questions:
+                    continue
+                gap = 1 - summary["correct_answers"] / total_questions
+                if gap <= 0:
+                    continue
+
+                for position in self.by_category.get((domain, category), []):
+                    weights[position] = weights.get(position, 0.0) + gap
+
+                skills = skill_values.get(domain, {}).get(category, {})
+                for skill_name_id, value in skills.items():
+                    if value:
+                        continue
+                    for position in self.by_skill.get(skill_name_id.lower(), []):
+                        weights[position] = weights.get(position, 0.0) + self.missed_skill_weight
+                        targets.setdefault(position, []).append(skill_name_id)
+
+        ranked = sorted(weights, key=lambda position: (-weights[position], position))[:limit]
+        return [self._plan_entry(position, weights[position], targets.get(position, [])) for position in ranked]
+
+    def recommend_for_users(self, skill_values_by_user: dict[any, dict[str, dict[str, dict[str, int]]]], limit: int = 5) -> dict[any, list[dict[str, any]]]:
+        plans = dict(self.iter_recommendations(skill_values_by_user.items(), limit))
+        logging.info(f"Generated exercise plans for {len(plans)} users")
+        return plans
+
+    def iter_recommendations(self, user_skill_values, limit: int = 5):
+        # Takes (user_id, skill values) pairs, e.g. from SkillData.iter_users_from_db, and yields (user_id, plan)
+        # pairs one at a time so a batch over every user never holds all plans in memory
+        for user_id, skill_values in user_skill_values:
+            scores = {
+                domain: {
+                    category: {"total_questions": len(skills), "correct_answers": sum(skills.values())}
+                    for category, skills in categories.items()
+                }
+                for domain, categories in skill_values.items()
+            }
+            yield user_id, self.recommend(scores, skill_values, limit)
+
+    def _plan_entry(self, position: int, weight: float, targeted_skills: list[str]) -> dict[str, any]:
+        exercise = self.exercises[position]
+        return {
+            "exercise_id": exercise["exercise_id"],
+            "title": exercise["title"],
+            "description": exercise.get("description", ""),
+            "domain": exercise["domain"],
+            "category": exercise["category"],
+            "minutes": exercise.get("minutes"),
+            "targeted_skills": targeted_skills,
+            "priority": round(weight, 3)
+        }
@@ -5,7 +5,7 @@ import os
 load_dotenv(find_dotenv())
 # AI Tools: Claude, Sumo, 11laps, Midjourney, github copilot,
 #print(f"OpenAI API KEY: {os.getenv("OPENAI_API_KEY")} ")
-def generate_story(score: int, max_tokens=500):
+def generate_story(score: int, max_tokens=500, target_letter: str = 'r'):
 
     OpenAI.api_key = os.getenv("OPENAI_API_KEY")
 
@@ -16,7 +16,7 @@ def generate_story(score: int, max_tokens=500):
               Generate a story that based on a score of {score}."""
     prompt: str = f"""Write a children's story about a princess named Janelle.
               She's smart and loves to have fun. Include whimsical elements of traveling through a forest.
-              Ensure words start letter 'r' often in the story. Many words will use the letter r because that
+              Ensure words start letter '{target_letter}' often in the story. Many words will use the letter {target_letter} because that
               is where the child is struggling. Use 100 words for the story MAXIMUM. MAKE SURE TO END THE STORY BASED ON THE LIMIT
               Ensure sentences are 6-8 words long and are coherent. """
     completion = client.chat.completions.create(
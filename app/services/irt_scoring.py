@@ -0,0 +1,237 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+import numpy as np
+from .skill_data import SkillData
+
+# Item response theory scoring next to the raw correct/total summary.
+# Item parameters (difficulty and, for 2PL, discrimination) are fitted from the stored skill_scores
+# matrix with joint maximum likelihood, and abilities are estimated per category with batched Newton
+# iterations. All updates are vectorized over respondents and items.
+# Normal priors keep estimates finite for children who answered every item right or wrong.
+
+IRT_MODELS = ("rasch", "2pl")
+
+_fitted_models: dict[tuple[str, str], tuple[float, "IrtModel"]] = {}
+_fit_lock = threading.Lock()
+_refreshers: dict[tuple[int, str], threading.Thread] = {}
+_refresher_lock = threading.Lock()
+
+
+class IrtModel:
+
+    def __init__(self, model: str, item_ids: list[str], difficulty: np.ndarray, discrimination: np.ndarray, taxonomy_version: str):
+        self.model: str = model
+        self.item_ids: list[str] = item_ids
+        self.difficulty: np.ndarray = difficulty
+        self.discrimination: np.ndarray = discrimination
+        self.taxonomy_version: str = taxonomy_version
+        self.item_positions: dict[str, int] = {item_id: position for position, item_id in enumerate(item_ids)}
+
+        # Column positions of every category, so ability estimation only looks at that category's items
+        self.category_items: dict[tuple[str, str], np.ndarray] = {}
+        categories: dict[tuple[str, str], list[int]] = {}
+        for position, item_id in enumerate(item_ids):
+            skill_name = ''.join([i for i in item_id.lower() if not i.isdigit()])
+            key = (SkillData.skill_name_to_domain.get(skill_name, "Unknown Domain"), SkillData.skill_name_to_category.get(skill_name, "Unknown Category"))
+            categories.setdefault(key, []).append(position)
+        for key, positions in categories.items():
+            self.category_items[key] = np.array(positions)
+
+    def item_parameters(self) -> dict[str, dict[str, float]]:
+        return {
+            item_id: {"difficulty": float(self.difficulty[position]), "discrimination": float(self.discrimination[position])}
+            for item_id, position in self.item_positions.items()
+        }
+
+
+def taxonomy_version() -> str:
+    # Changes whenever the skill id -> domain/category mappings change, which invalidates fitted parameters
+    taxonomy = repr(sorted(SkillData.skill_name_to_category.items())) + repr(sorted(SkillData.skill_name_to_domain.items()))
+    return hashlib.sha1(taxonomy.encode()).hexdigest()[:12]
+
+
+def build_response_matrix(skill_values_by_user: dict[any, dict[str, dict[str, dict[str, int]]]], item_ids: list[str] = None) -> tuple[list, list[str], np.ndarray]:
+    # Rows are respondents, columns are items, missing responses are NaN
+    if item_ids is None:
+        item_ids = sorted({
+            skill_name_id
+            for skill_values in skill_values_by_user.values()
+            for categories in skill_values.values()
+            for skills in categories.values()
+            for skill_name_id in skills
+        })
+    item_positions = {item_id: position for position, item_id in enumerate(item_ids)}
+    user_ids = list(skill_values_by_user)
+
+    matrix = np.full((len(user_ids), len(item_ids)), np.nan)
+    for row, user_id in enumerate(user_ids):
+        for categories in skill_values_by_user[user_id].values():
+            for skills in categories.values():
+                for skill_name_id, value in skills.items():
+                    column = item_positions.get(skill_name_id)
+                    if column is not None and value is not None:
+                        matrix[row, column] = 1.0 if value else 0.0
+    return user_ids, item_ids, matrix
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def estimate_abilities(responses: np.ndarray, difficulty: np.ndarray, discrimination: np.ndarray, iterations: int = 20, tolerance: float = 1e-6) -> tuple[np.ndarray, np.ndarray]:
+    # MAP ability estimates with a standard normal prior, one Newton step for every respondent per iteration.
+    # Returns the abilities and their standard errors.
+    mask = ~np.isnan(responses)
+    answers = np.where(mask, responses, 0.0)
+    theta = np.zeros(responses.shape[0])
+    information = np.ones(responses.shape[0])
+
+    for _ in range(iterations):
+        p = _sigmoid(discrimination * (theta[:, None] - difficulty))
+        gradient = (discrimination * (answers - p) * mask).sum(axis=1) - theta
+        information = (discrimination ** 2 * p * (1 - p) * mask).sum(axis=1) + 1.0
+        step = gradient / information
+        theta += step
+        if np.abs(step).max(initial=0.0) < tolerance:
+            break
+
+    return theta, 1.0 / np.sqrt(information)
+
+
+def fit_item_parameters(responses: np.ndarray, model: str = "rasch", iterations: int = 50, difficulty_prior_sd: float = 2.0,
+                        discrimination_prior_sd: float = 0.5) -> tuple[np.ndarray, np.ndarray]:
+    # Joint maximum likelihood: alternate one batched Newton step for abilities and one for item parameters
+    if model not in IRT_MODELS:
+        raise ValueError(f"Unknown IRT model: {model}")
+    mask = ~np.isnan(responses)
+    answers = np.where(mask, responses, 0.0)
+    theta = np.zeros(responses.shape[0])
+    difficulty = np.zeros(responses.shape[1])
+    discrimination = np.ones(responses.shape[1])
+
+    for _ in range(iterations):
+        p = _sigmoid(discrimination * (theta[:, None] - difficulty))
+        residual = (answers - p) * mask
+        weight = p * (1 - p) * mask
+        theta += ((discrimination * residual).sum(axis=1) - theta) / ((discrimination ** 2 * weight).sum(axis=1) + 1.0)
+        if model == "2pl" and theta.size > 1:
+            # The 2PL scale is only identified up to a linear transform of theta. Without fixing it, the N(0, 1)
+            # prior on thousands of abilities outweighs the discrimination prior and JML shrinks theta while
+            # inflating a. Standardizing keeps abilities on the same N(0, 1) scale as the Rasch fit.
+            theta = (theta - theta.mean()) / max(theta.std(), 1e-6)
+
+        p = _sigmoid(discrimination * (theta[:, None] - difficulty))
+        residual = (answers - p) * mask
+        weight = p * (1 - p) * mask
+        difficulty_gradient = -(discrimination * residual).sum(axis=0) - difficulty / difficulty_prior_sd ** 2
+        difficulty_information = (discrimination ** 2 * weight).sum(axis=0) + 1.0 / difficulty_prior_sd ** 2
+        difficulty += difficulty_gradient / difficulty_information
+
+        if model == "2pl":
+            p = _sigmoid(discrimination * (theta[:, None] - difficulty))
+            distance = theta[:, None] - difficulty
+            discrimination_gradient = ((answers - p) * mask * distance).sum(axis=0) - (discrimination - 1.0) / discrimination_prior_sd ** 2
+            discrimination_information = (distance ** 2 * p * (1 - p) * mask).sum(axis=0) + 1.0 / discrimination_prior_sd ** 2
+            discrimination = np.clip(discrimination + discrimination_gradient / discrimination_information, 0.2, 4.0)
+
+    return difficulty, discrimination
+
+
+def fit_model(skill_values_by_user: dict[any, dict[str, dict[str, dict[str, int]]]], model: str = "rasch") -> IrtModel:
+    start_time = time.time()
+    user_ids, item_ids, responses = build_response_matrix(skill_values_by_user)
+    difficulty, discrimination = fit_item_parameters(responses, model)
+    logging.info(f"Fitted {model} parameters for {len(item_ids)} items from {len(user_ids)} users in {time.time() - start_time:.3f} seconds")
+    return IrtModel(model, item_ids, difficulty, discrimination, taxonomy_version())
+
+
+def _fit_and_cache(load_skill_values_by_user, model: str) -> IrtModel:
+    fitted = fit_model(load_skill_values_by_user(), model)
+    # A fit without items (empty table, or the load came back empty) is returned but never cached
+    if fitted.item_ids:
+        _fitted_models[(fitted.taxonomy_version, model)] = (time.time(), fitted)
+    else:
+        logging.warning(f"Not caching {model} model fitted without any items")
+    return fitted
+
+
+def get_model(load_skill_values_by_user, model: str = "rasch", max_age: float = None) -> IrtModel:
+    # Fitted parameters are cached per taxonomy version and refitted once they are older than max_age seconds,
+    # load_skill_values_by_user is only called on a cache miss
+    key = (taxonomy_version(), model)
+    cached = _fitted_models.get(key)
+    if cached is not None and (max_age is None or time.time() - cached[0] < max_age):
+        return cached[1]
+    with _fit_lock:
+        cached = _fitted_models.get(key)
+        if cached is not None and (max_age is None or time.time() - cached[0] < max_age):
+            return cached[1]
+        return _fit_and_cache(load_skill_values_by_user, model)
+
+
+def cached_model(model: str = "rasch") -> IrtModel | None:
+    # Never fits, returns the last model the refresher fitted for the current taxonomy, stale or not
+    cached = _fitted_models.get((taxonomy_version(), model))
+    return cached[1] if cached is not None else None
+
+
+def start_model_refresher(load_skill_values_by_user, model: str = "rasch", interval: float = 3600.0) -> threading.Thread:
+    # Fits the model right away and then every interval seconds, so requests find a warm cache.
+    # Threads do not survive a fork, so this is called lazily from the worker and starts one thread per
+    # process and model, later calls in the same process are no-ops.
+    key = (os.getpid(), model)
+    with _refresher_lock:
+        refresher = _refreshers.get(key)
+        if refresher is not None and refresher.is_alive():
+            return refresher
+
+        def run():
+            while True:
+                try:
+                    with _fit_lock:
+                        _fit_and_cache(load_skill_values_by_user, model)
+                except Exception as e:
+                    logging.error(f"IRT model refresh failed: {e!r}")
+                time.sleep(interval)
+
+        refresher = threading.Thread(target=run, name=f"irt-refresher-{model}", daemon=True)
+        refresher.start()
+        _refreshers[key] = refresher
+        return refresher
+
+
+def clear_model_cache() -> None:
+    _fitted_models.clear()
+
+
+def estimate_category_abilities(irt_model: IrtModel, skill_values_by_user: dict[any, dict[str, dict[str, dict[str, int]]]]) -> dict[any, dict[str, dict[str, dict[str, float]]]]:
+    # Abilities for many respondents at once, one batched estimation per category
+    user_ids, _, responses = build_response_matrix(skill_values_by_user, irt_model.item_ids)
+    abilities: dict[any, dict[str, dict[str, dict[str, float]]]] = {user_id: {} for user_id in user_ids}
+
+    for (domain, category), positions in irt_model.category_items.items():
+        category_responses = responses[:, positions]
+        answered = (~np.isnan(category_responses)).sum(axis=1)
+        theta, standard_error = estimate_abilities(category_responses, irt_model.difficulty[positions], irt_model.discrimination[positions])
+        for row, user_id in enumerate(user_ids):
+            if not answered[row]:
+                continue
+            abilities[user_id].setdefault(domain, {})[category] = {
+                "ability": round(float(theta[row]), 4),
+                "ability_se": round(float(standard_error[row]), 4),
+                "irt_items_scored": int(answered[row])
+            }
+    return abilities
+
+
+def add_abilities_to_scores(scores: dict[str, dict[str, dict[str, int]]], skill_values: dict[str, dict[str, dict[str, int]]], irt_model: IrtModel) -> dict[str, dict[str, dict[str, any]]]:
+    # Adds ability fields next to total_questions/correct_answers in the output of calculate_score_in_all_categories
+    abilities = estimate_category_abilities(irt_model, {None: skill_values})[None]
+    for domain, categories in scores.items():
+        for category, summary in categories.items():
+            summary.update(abilities.get(domain, {}).get(category, {"ability": None, "ability_se": None, "irt_items_scored": 0}))
+            summary["irt_model"] = irt_model.model
+    return scores
@@ -0,0 +1,154 @@
+import io
+import os
+import csv
+import sys
+import json
+import logging
+import argparse
+from dotenv import load_dotenv, find_dotenv
+from .skill_data import SkillData
+
+# Streaming export of the score tables.
+# Rows are read page by page with keyset pagination on the primary key and only the exported columns
+# are selected, so an export of every user keeps a constant amount of rows in memory.
+
+EXPORT_COLUMNS: dict[str, list[str]] = {
+    "skill_scores": ["id", "user_id", "skill_name_id", "skill_value", "created_at"],
+    "category_scores": ["id", "user_id", "domain", "category", "total_questions", "correct_answers", "created_at"]
+}
+
+EXPORT_FORMATS: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def skill_name_pattern(category: str) -> str:
+    # skill_scores has no category column, the category is encoded in the skill_name_id prefix (PhAw12 -> phaw)
+    prefixes = [prefix for prefix, mapped_category in SkillData.skill_name_to_category.items() if mapped_category == category]
+    if not prefixes:
+        raise ValueError(f"Unknown category: {category}")
+    return f"^({'|'.join(prefixes)})[0-9]+$"
+
+
+def iter_table(supabase, table_name: str, user_id=None, start_date: str = None, end_date: str = None, category: str = None,
+               page_size: int = 1000, execute=None, user_ids: list = None):
+    if table_name not in EXPORT_COLUMNS:
+        raise ValueError(f"Unknown table: {table_name}")
+    if page_size < 1:
+        raise ValueError(f"page_size must be at least 1, got {page_size}")
+    execute = execute or (lambda query: query.execute())
+    columns = ",".join(EXPORT_COLUMNS[table_name])
+    last_id = None
+
+    while True:
+        query = supabase.from_(table_name).select(columns).order("id").limit(page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        if user_id is not None:
+            query = query.eq("user_id", user_id)
+        if user_ids is not None:
+            query = query.in_("user_id", user_ids)
+        if start_date:
+            query = query.gte("created_at", start_date)
+        if end_date:
+            query = query.lte("created_at", end_date)
+        if category:
+            if table_name == "category_scores":
+                query = query.eq("category", category)
+            else:
+                query = query.filter("skill_name_id", "imatch", skill_name_pattern(category))
+
+        rows = execute(query).data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def to_csv(rows, columns: list[str]):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        # Flush the buffer every row so it never holds more than one line
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_error_record(export_format: str, rows_exported: int, last_id, error: Exception) -> str:
+    # Last line of an export that stopped early. Clients check for it, so a truncated file is never taken as complete.
+    record = {"export_error": type(error).__name__, "rows_exported": rows_exported, "last_id": last_id}
+    if export_format == "csv":
+        return f"#export_error={record['export_error']},rows_exported={rows_exported},last_id={last_id}\r\n"
+    return json.dumps(record, default=str) + "\n"
+
+
+def export_rows(rows, table_name: str, export_format: str, error_record: bool = True):
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    return _export_chunks(rows, table_name, export_format, error_record)
+
+
+def _export_chunks(rows, table_name: str, export_format: str, error_record: bool):
+    progress = {"rows": 0, "last_id": None}
+
+    def tracked_rows():
+        for row in rows:
+            progress["rows"] += 1
+            progress["last_id"] = row.get("id")
+            yield row
+
+    if export_format == "ndjson":
+        chunks = to_ndjson(tracked_rows())
+    else:
+        chunks = to_csv(tracked_rows(), EXPORT_COLUMNS[table_name])
+    try:
+        yield from chunks
+    except Exception as e:
+        # The response status is already sent, so the failure and the cursor to resume from go into the body and the log
+        logging.error(f"Export of {table_name} stopped after {progress['rows']} rows, last id {progress['last_id']}: {e!r}")
+        if not error_record:
+            raise
+        yield export_error_record(export_format, progress["rows"], progress["last_id"], e)
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export skill_scores or category_scores as NDJSON or CSV")
+    parser.add_argument("--table", choices=list(EXPORT_COLUMNS), default="category_scores")
+    parser.add_argument("--format", dest="export_format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--user-id")
+    parser.add_argument("--start-date", help="Only rows created at or after this ISO date")
+    parser.add_argument("--end-date", help="Only rows created at or before this ISO date")
+    parser.add_argument("--category", help="Skill category, e.g. phonological_awareness")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--output", help="Output file, defaults to stdout")
+    args = parser.parse_args(argv)
+
+    load_dotenv(find_dotenv())
+    from supabase import create_client
+    supabase = create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY'))
+
+    rows = iter_table(supabase, args.table, args.user_id, args.start_date, args.end_date, args.category, args.page_size)
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        # The CLI fails with a non-zero exit status instead of writing an error record
+        for chunk in export_rows(rows, args.table, args.export_format, error_record=False):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+    logging.info(f"Exported {args.table} as {args.export_format}")
+
+
+if __name__ == "__main__":
+    main()
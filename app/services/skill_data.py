@@ -1,6 +1,7 @@
 import os
 import re
 import logging
+from datetime import datetime, timezone
 from dotenv import load_dotenv, find_dotenv
 from supabase import create_client, Client
 
@@ -48,8 +49,14 @@ class SkillData:
     }
 
     positive_values = {'choice one', 'yes'}
-    def __init__(self):
+    def __init__(self, db_guard=None, cache=None):
         self.data: dict[str, dict[str, dict[str, any]]] = {}
+        self.email: str = None
+        # Optional DatabaseGuard (app/services/db_resilience.py) shared by the whole process.
+        # Without one, queries are executed directly like before.
+        self.db_guard = db_guard
+        # Optional SharedCache (app/utils/shared_cache.py) used for email -> user_id lookups
+        self.cache = cache
         self.supabase_url: str = os.getenv('SUPABASE_URL')
         self.supabase_key: str = os.getenv('SUPABASE_API_KEY')
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
@@ -63,6 +70,19 @@ class SkillData:
             'tskill': 'TSkill'
         }
 
+    def _execute(self, query):
+        if self.db_guard is None:
+            return query.execute()
+        return self.db_guard.execute(query)
+
+    def _write(self, table_name: str, operation: str, rows: list[dict[str, any]], query, key_columns: str = None, missing_user: bool = False):
+        # Writes without a user_id (the user could not be created) go straight to the spill journal
+        if self.db_guard is None:
+            return query.execute()
+        if missing_user:
+            query = None
+        return self.db_guard.write(table_name, operation, rows, query, key_columns, self.email)
+
     '''
     
     The methods below will be used for database operations based on the categorization of the data.
@@ -166,6 +186,24 @@ class SkillData:
         logging.info(f"Scores for all categories: {scores}")
         return scores
 
+    def weakest_category(self) -> tuple[str, str] | None:
+        return SkillData.weakest_category_in_scores(self.calculate_score_in_all_categories())
+
+    @staticmethod
+    def weakest_category_in_scores(scores: dict[str, dict[str, dict[str, any]]]) -> tuple[str, str] | None:
+        # Category with the lowest share of correct answers, ties go to the category with more questions.
+        # Takes the output of calculate_score_in_all_categories, e.g. the scores of a cached report.
+        weakest, weakest_key = None, None
+        for domain, categories in scores.items():
+            for category, summary in categories.items():
+                if not summary["total_questions"]:
+                    continue
+                key = (summary["correct_answers"] / summary["total_questions"], -summary["total_questions"])
+                if weakest_key is None or key < weakest_key:
+                    weakest, weakest_key = (domain, category), key
+        logging.info(f"Weakest category: {weakest}")
+        return weakest
+
   
     def update_skill_value(self, user_id: str, domain: str, category: str, skill_name_id: str, value: any):
         # Create a dictionary for the skill to update
@@ -177,11 +215,13 @@ class SkillData:
         }
 
         # Update the value of the specified skill
-        response = self.supabase.from_("skills").update({"skill_value": skill_value}).match(skill_filter).execute()
+        query = self.supabase.from_("skills").update({"skill_value": value}).match(skill_filter)
+        response = self._write("skills", "update", [{"values": {"skill_value": value}, "match": skill_filter}], query, missing_user=user_id is None)
         return response
     def upload_all_skill_values_to_db(self, user_id: int):
         # Flatten the data for upload
         skill_values_to_upload = []
+        response = None
         for domain, categories in self.data.items():
             for category, skills in categories.items():
                 for skill_name_id, skill_value in skills.items():
@@ -197,8 +237,13 @@ class SkillData:
                         "skill_value": skill_value
                     })
 
-                    #response = self.supabase.from_("skills").insert(skill_values_to_upload).execute()
-                    response = self.upsert_skill_value(user_id, transformed_skill_name_id, skill_value)
+        if self.db_guard is not None and (user_id is None or not self.db_guard.breaker.can_attempt()):
+            # Spill the whole batch as one journal entry instead of one entry per skill
+            return self._write("skill_scores", "upsert", skill_values_to_upload, None, "user_id,skill_name_id", user_id is None)
+
+        for skill_value_to_upload in skill_values_to_upload:
+            #response = self.supabase.from_("skills").insert(skill_values_to_upload).execute()
+            response = self.upsert_skill_value(user_id, skill_value_to_upload["skill_name_id"], skill_value_to_upload["skill_value"])
         #if response.status not in range(200, 300):
         #    logging.error(f"Error inserting skill values: {response.status} - {response.data}")
         #else:
@@ -215,14 +260,21 @@ class SkillData:
 
         # Check if the record exists # .match("{"skill_name_is" : TSkill83}")
         # existing_record = self.supabase.from_("skills").select("skill_name_id").match(skill_filter).execute()
-        existing_record = self.supabase.from_("skill_scores").select("skill_name_id").match(skill_filter).execute()
+        skill_to_upsert = dict(skill_filter, skill_value=skill_value)
+        try:
+            existing_record = self._execute(self.supabase.from_("skill_scores").select("skill_name_id").match(skill_filter))
+        except Exception:
+            if self.db_guard is None:
+                raise
+            # The lookup failed, so the write is spilled as an upsert and resolved on replay
+            return self._write("skill_scores", "upsert", [skill_to_upsert], None, "user_id,skill_name_id", user_id is None)
         print(f"This is the existing record: {existing_record}")
 
         if existing_record.data:
             # Record exists, update the value #VALUE NOT UPDATED
 
-            response = self.supabase.from_("skill_scores").update({"skill_value": skill_value}).match(
-                skill_filter).execute()
+            query = self.supabase.from_("skill_scores").update({"skill_value": skill_value}).match(skill_filter)
+            response = self._write("skill_scores", "upsert", [skill_to_upsert], query, "user_id,skill_name_id", user_id is None)
             print(f"Record already exists, response: {response}, updated skill_value: {skill_value}")
 
         else:
@@ -232,13 +284,16 @@ class SkillData:
             skill_to_insert["user_id"] = user_id
             print(f"Skill to insert: {skill_to_insert}")
 
-            response = self.supabase.from_("skill_scores").insert(skill_to_insert).execute()
+            query = self.supabase.from_("skill_scores").insert(skill_to_insert)
+            response = self._write("skill_scores", "upsert", [skill_to_upsert], query, "user_id,skill_name_id", user_id is None)
             print(f"Record does not exist, response: {response}")
 
         return response
 
 
     def insert_scores_by_category_into_db(self, user_id: str, scores: dict[str, dict[str, dict[str, int]]]) -> None:
+        # created_at is set here rather than by the database so every submission carries its own idempotency key
+        submitted_at = datetime.now(timezone.utc).isoformat()
         score_records = []
         for domain, categories in scores.items():
             for category, score in categories.items():
@@ -247,11 +302,15 @@ class SkillData:
                     "domain": domain,
                     "category": category,
                     "total_questions": score["total_questions"],
-                    "correct_answers": score["correct_answers"]
+                    "correct_answers": score["correct_answers"],
+                    "created_at": submitted_at
                 })
 
         # Assuming the table for scores is named 'category_scores'
-        response = self.supabase.from_("category_scores").insert(score_records).execute()
+        # A spilled row is matched on its submission time on replay, so a snapshot that already landed is not
+        # written twice while a re-screening with identical results is still kept
+        query = self.supabase.from_("category_scores").insert(score_records)
+        response = self._write("category_scores", "insert_missing", score_records, query, "user_id,domain,category,created_at", user_id is None)
         ### search for this error code, add into code
         #if response.status_code not in range(200, 300):
         #    logging.info(f"Inserted scores by category successfully: {response.data}")
@@ -259,17 +318,52 @@ class SkillData:
         #    logging.error(f"Error inserting scores by category: {response.status_code} - {response.error_message}")
         return response
 
+    def _add_skill_record(self, data: dict[str, dict[str, dict[str, int]]], record: dict[str, any]) -> None:
+        # skill_scores stores the transformed id (PhAw12), self.data uses the lowercase screener id (phaw12)
+        skill_name_id = record["skill_name_id"].lower()
+        domain = self.determine_domain(skill_name_id)
+        category = self.determine_category(skill_name_id)
+        if domain == "Unknown Domain" or category == "Unknown Category":
+            logging.warning(f"Unrecognized domain or category for stored skill {record['skill_name_id']}")
+            return
+        data.setdefault(domain, {}).setdefault(category, {})[skill_name_id] = record["skill_value"]
+
     def load_from_db(self, user_id: int):
-        response = self.supabase.from_("skills").select("*").eq("user_id", user_id).execute()
+        from .score_export import iter_table
         self.data = {}
-        for record in response.data:
-            domain, category, skill_name_id = record["domain"], record["category"], record["skill_name_id"]
-            if domain not in self.data:
-                self.data[domain] = {}
-            if category not in self.data[domain]:
-                self.data[domain][category] = {}
-            self.data[domain][category][skill_name_id] = record["value"]
-
+        for record in iter_table(self.supabase, "skill_scores", user_id=user_id, execute=self._execute):
+            self._add_skill_record(self.data, record)
+
+    def load_all_users_from_db(self) -> dict[any, dict[str, dict[str, dict[str, int]]]]:
+        # Loads the skill values of every user, keyed by user_id, in the same nested format as self.data
+        from .score_export import iter_table
+        data_by_user: dict[any, dict[str, dict[str, dict[str, int]]]] = {}
+        for record in iter_table(self.supabase, "skill_scores", execute=self._execute):
+            self._add_skill_record(data_by_user.setdefault(record["user_id"], {}), record)
+        logging.info(f"Loaded skill values for {len(data_by_user)} users")
+        return data_by_user
+
+    def iter_users_from_db(self, batch_size: int = 200):
+        # Yields (user_id, skill values) user by user. Users are paged by user_id and the skill values of one
+        # batch are loaded at a time, so a pass over every user only holds batch_size users in memory.
+        from .score_export import iter_table
+        last_user_id = None
+        while True:
+            query = self.supabase.from_("users").select("user_id").order("user_id").limit(batch_size)
+            if last_user_id is not None:
+                query = query.gt("user_id", last_user_id)
+            user_ids = [row["user_id"] for row in self._execute(query).data]
+            if not user_ids:
+                return
+            data_by_user: dict[any, dict[str, dict[str, dict[str, int]]]] = {}
+            for record in iter_table(self.supabase, "skill_scores", execute=self._execute, user_ids=user_ids):
+                self._add_skill_record(data_by_user.setdefault(record["user_id"], {}), record)
+            for user_id in user_ids:
+                if user_id in data_by_user:
+                    yield user_id, data_by_user[user_id]
+            if len(user_ids) < batch_size:
+                return
+            last_user_id = user_ids[-1]
 
     def transform_variable_name(self, variable_name: str, mapping: dict[str, str]) -> str:
         match = re.match(r"([a-zA-Z]+)(\d+)", variable_name)
@@ -289,19 +383,49 @@ class SkillData:
 
 # These methods were used for beta testing, authentication will be integrated via Supabase/Google Cloud
 
-  def initialize_user_tmp(self, email: str) -> str:
+    def initialize_user_tmp(self, email: str) -> str:
+        cache_key = f"user:{email}"
+        if self.cache is not None and email:
+            user_id = self.cache.get(cache_key)
+            if user_id is not None:
+                logging.info(f"User ID for {email} found in cache: {user_id}")
+                return user_id
+
+        # Reuse the newest user with this email, the cache only remembers what the database returned
+        if email:
+            try:
+                query = self.supabase.from_("users").select("user_id").eq("email", email).order("user_id", desc=True).limit(1)
+                response = self._execute(query)
+            except Exception as e:
+                logging.warning(f"User lookup for {email} failed, creating the user instead: {e!r}")
+                response = None
+            if response is not None and response.data:
+                user_id = response.data[0]['user_id']
+                logging.info(f"Existing user found for {email}: {user_id}")
+                if self.cache is not None:
+                    self.cache.set(cache_key, user_id)
+                return user_id
+
         # Insert the user into the database
-        response = self.supabase.from_("users").insert({"email": email}).execute()
+        query = self.supabase.from_("users").insert({"email": email})
+        response = self._write("users", "insert_missing", [{"email": email}], query, "email")
+        if response is None:
+            # The user is created when the journal is replayed, later rows are linked through self.email
+            logging.warning(f"Database unavailable, user creation for {email} was spilled to the journal")
+            return None
         if not response.data:
             logging.error(f"Error inserting user: {response.status_code} - {response.error_message}")
             return None
         user_id = response.data[0]['user_id']
         logging.info(f"User initialized with ID: {user_id}")
+        if self.cache is not None and email:
+            self.cache.set(cache_key, user_id)
         return user_id
 
     def extract_email_from_webhook(self, webhook_data: dict[str, any]) -> str:
         # Extract email from the webhook data
         email = webhook_data.get('email')
+        self.email = email
         if email:
             logging.info(f"Extracted email from webhook: {email}")
         else:
@@ -0,0 +1,219 @@
+import re
+import math
+import random
+import logging
+
+# Offline story generator used instead of (or as a fallback for) the gpt-4o call in generate_story.
+# Stories are built from princess/forest sentence templates filled from a small lexicon that is indexed
+# by initial sound and reading level, so most slots use words that start with the sound the child is
+# struggling with. Every template is 6-8 words once filled and the story stops before max_words.
+
+# Letter practiced when the target comes from the child's weakest category.
+# The screener item ids (ak3, phaw5, ...) do not record which letter or sound an item tests, so the letter cannot
+# be derived from the missed items. This is a fixed product choice instead: every category gets its own common
+# consonant, so a child sees a different practice letter when a different area needs work. It is not a diagnosis,
+# which is why /generate_story reports letter_source="weakest_category" next to the letter.
+# 'r' is the letter the original gpt-4o prompt always used, and it stays the default for unknown categories.
+CATEGORY_TARGET_LETTERS: dict[str, str] = {
+    'phonological_awareness': 'r',
+    'print_knowledge': 'b',
+    'alphabet_knowledge': 's',
+    'comprehension': 'm',
+    'text_structure': 't',
+    'writing': 'w',
+    'test_skill_category': 'r'
+}
+
+# Letters a story can target and the initial sound practiced for each, the lexicon is indexed by sound.
+# 'c' and 'k' both practice the hard /k/ sound, so a 'c' story also uses words like "kite".
+LETTER_SOUNDS: dict[str, str] = {
+    'r': 'r', 'b': 'b', 's': 's', 'm': 'm', 't': 't', 'w': 'w',
+    'c': 'k', 'k': 'k', 'f': 'f', 'j': 'j', 'l': 'l', 'p': 'p'
+}
+
+# word, initial sound, reading level (1-3), part of speech
+# Parts of speech: noun, adj, iverb (past tense, no object), tverb (past tense, takes an object), place
+LEXICON: list[tuple[str, str, int, str]] = [
+    # r
+    ("rabbit", "r", 1, "noun"), ("robin", "r", 1, "noun"), ("rock", "r", 1, "noun"), ("ring", "r", 1, "noun"),
+    ("raccoon", "r", 2, "noun"), ("ribbon", "r", 2, "noun"), ("rainbow", "r", 2, "noun"), ("reindeer", "r", 3, "noun"),
+    ("red", "r", 1, "adj"), ("round", "r", 1, "adj"), ("rosy", "r", 2, "adj"), ("royal", "r", 2, "adj"), ("radiant", "r", 3, "adj"),
+    ("ran", "r", 1, "iverb"), ("rested", "r", 1, "iverb"), ("rolled", "r", 2, "iverb"), ("raced", "r", 2, "iverb"), ("roamed", "r", 3, "iverb"),
+    ("read", "r", 1, "tverb"), ("rescued", "r", 2, "tverb"), ("reached", "r", 2, "tverb"), ("remembered", "r", 3, "tverb"),
+    ("river", "r", 1, "place"), ("road", "r", 1, "place"), ("ridge", "r", 2, "place"), ("ravine", "r", 3, "place"),
+    # b
+    ("bear", "b", 1, "noun"), ("bird", "b", 1, "noun"), ("bee", "b", 1, "noun"), ("bunny", "b", 1, "noun"), ("butterfly", "b", 2, "noun"), ("badger", "b", 3, "noun"),
+    ("big", "b", 1, "adj"), ("blue", "b", 1, "adj"), ("brave", "b", 2, "adj"), ("bright", "b", 2, "adj"), ("bashful", "b", 3, "adj"),
+    ("bounced", "b", 1, "iverb"), ("bowed", "b", 2, "iverb"), ("bustled", "b", 3, "iverb"),
+    ("built", "b", 1, "tverb"), ("brought", "b", 2, "tverb"), ("borrowed", "b", 3, "tverb"),
+    ("brook", "b", 1, "place"), ("bridge", "b", 1, "place"), ("bramble", "b", 3, "place"),
+    # s
+    ("snail", "s", 1, "noun"), ("star", "s", 1, "noun"), ("sun", "s", 1, "noun"), ("squirrel", "s", 2, "noun"), ("swan", "s", 2, "noun"), ("sparrow", "s", 3, "noun"),
+    ("soft", "s", 1, "adj"), ("silly", "s", 1, "adj"), ("sunny", "s", 1, "adj"), ("sparkly", "s", 2, "adj"), ("splendid", "s", 3, "adj"),
+    ("sang", "s", 1, "iverb"), ("skipped", "s", 1, "iverb"), ("strolled", "s", 2, "iverb"), ("sprinted", "s", 3, "iverb"),
+    ("saw", "s", 1, "tverb"), ("shared", "s", 2, "tverb"), ("searched", "s", 3, "tverb"),
+    ("stream", "s", 1, "place"), ("sand", "s", 1, "place"), ("summit", "s", 3, "place"),
+    # m
+    ("mouse", "m", 1, "noun"), ("moth", "m", 1, "noun"), ("moon", "m", 1, "noun"), ("mushroom", "m", 2, "noun"), ("meerkat", "m", 3, "noun"),
+    ("merry", "m", 1, "adj"), ("mossy", "m", 2, "adj"), ("magic", "m", 1, "adj"), ("marvelous", "m", 3, "adj"),
+    ("marched", "m", 1, "iverb"), ("moved", "m", 1, "iverb"), ("meandered", "m", 3, "iverb"),
+    ("met", "m", 1, "tverb"), ("made", "m", 1, "tverb"), ("mended", "m", 2, "tverb"),
+    ("meadow", "m", 1, "place"), ("marsh", "m", 2, "place"), ("mountain", "m", 2, "place"),
+    # t
+    ("turtle", "t", 1, "noun"), ("toad", "t", 1, "noun"), ("tree", "t", 1, "noun"), ("tiger", "t", 2, "noun"), ("toucan", "t", 3, "noun"),
+    ("tall", "t", 1, "adj"), ("tiny", "t", 1, "adj"), ("tidy", "t", 2, "adj"), ("terrific", "t", 3, "adj"),
+    ("tiptoed", "t", 1, "iverb"), ("twirled", "t", 2, "iverb"), ("trotted", "t", 2, "iverb"),
+    ("took", "t", 1, "tverb"), ("tickled", "t", 2, "tverb"), ("treasured", "t", 3, "tverb"),
+    ("trail", "t", 1, "place"), ("thicket", "t", 3, "place"), ("tower", "t", 1, "place"),
+    # w
+    ("wolf", "w", 1, "noun"), ("worm", "w", 1, "noun"), ("whale", "w", 2, "noun"), ("walrus", "w", 2, "noun"), ("woodpecker", "w", 3, "noun"),
+    ("warm", "w", 1, "adj"), ("wet", "w", 1, "adj"), ("wise", "w", 2, "adj"), ("wonderful", "w", 3, "adj"),
+    ("walked", "w", 1, "iverb"), ("waved", "w", 1, "iverb"), ("wandered", "w", 2, "iverb"), ("whistled", "w", 3, "iverb"),
+    ("washed", "w", 1, "tverb"), ("watched", "w", 1, "tverb"), ("welcomed", "w", 3, "tverb"),
+    ("woods", "w", 1, "place"), ("well", "w", 1, "place"), ("waterfall", "w", 2, "place"),
+    # words whose sound differs from their first letter, indexed by sound
+    ("cat", "k", 1, "noun"), ("kite", "k", 1, "noun"), ("kitten", "k", 1, "noun"), ("kind", "k", 1, "adj"), ("cozy", "k", 2, "adj"),
+    ("climbed", "k", 1, "iverb"), ("crawled", "k", 2, "iverb"), ("carried", "k", 1, "tverb"), ("caught", "k", 2, "tverb"),
+    ("cave", "k", 1, "place"), ("castle", "k", 2, "place"),
+    ("city", "s", 2, "place"), ("circle", "s", 2, "noun"),
+    ("phoenix", "f", 3, "noun"), ("fox", "f", 1, "noun"), ("fuzzy", "f", 1, "adj"), ("flew", "f", 1, "iverb"), ("field", "f", 1, "place"),
+    ("giraffe", "j", 2, "noun"), ("jolly", "j", 1, "adj"), ("jumped", "j", 1, "iverb"), ("juggled", "j", 2, "tverb"), ("jungle", "j", 2, "place"),
+    ("lamb", "l", 1, "noun"), ("little", "l", 1, "adj"), ("laughed", "l", 1, "iverb"), ("lifted", "l", 2, "tverb"), ("lake", "l", 1, "place"),
+    ("pony", "p", 1, "noun"), ("pink", "p", 1, "adj"), ("played", "p", 1, "iverb"), ("picked", "p", 1, "tverb"), ("pond", "p", 1, "place"),
+    # filler words used when a target-sound word does not exist for a slot
+    ("owl", "o", 1, "noun"), ("deer", "d", 1, "noun"), ("green", "g", 1, "adj"), ("happy", "h", 1, "adj"),
+    ("hopped", "h", 1, "iverb"), ("danced", "d", 1, "iverb"), ("found", "f", 1, "tverb"), ("hugged", "h", 1, "tverb"),
+    ("glade", "g", 2, "place"), ("hill", "h", 1, "place"), ("garden", "g", 1, "place"),
+]
+
+# Each template is 6-8 words once every slot is filled with a single word
+OPENING_TEMPLATE = "Princess {name} went into the {adj} forest."
+CLOSING_TEMPLATE = "Then {name} went home, {adj} and happy."
+STORY_TEMPLATES: list[str] = [
+    "{name} found a {adj} {noun} there.",
+    "A {adj} {noun} {iverb} by the {place}.",
+    "She saw a {noun} near the {place}.",
+    "The {noun} was {adj} and very {adj}.",
+    "{name} and the {noun} {iverb} together.",
+    "They {iverb} past the {adj} {place} today.",
+    "The {adj} {noun} {tverb} a {noun}.",
+    "{name} smiled at the {adj} little {noun}.",
+    "Soon the {noun} {iverb} over the {place}.",
+    "What a {adj} day by the {place}!",
+    "{name} {tverb} the {noun} with care.",
+]
+
+_SLOT_PATTERN = re.compile(r"\{(\w+)\}")
+
+
+class Lexicon:
+
+    def __init__(self, entries: list[tuple[str, str, int, str]]):
+        # (sound, part of speech) -> words by reading level, and part of speech -> all words by reading level
+        self.by_sound: dict[tuple[str, str], dict[int, list[str]]] = {}
+        self.by_pos: dict[str, dict[int, list[str]]] = {}
+        self.sounds: dict[str, str] = {}
+        for word, sound, level, pos in entries:
+            self.sounds[word] = sound
+            self.by_sound.setdefault((sound, pos), {}).setdefault(level, []).append(word)
+            self.by_pos.setdefault(pos, {}).setdefault(level, []).append(word)
+
+    def words(self, pos: str, reading_level: int, sound: str = None) -> list[str]:
+        index = self.by_pos.get(pos, {}) if sound is None else self.by_sound.get((sound, pos), {})
+        return [word for level, words in index.items() if level <= reading_level for word in words]
+
+    def sound_of(self, word: str) -> str:
+        # Words outside the lexicon (template words, names) are assumed to start with their first letter's sound
+        word = word.lower()
+        return self.sounds.get(word, LETTER_SOUNDS.get(word[:1], word[:1]))
+
+
+DEFAULT_LEXICON = Lexicon(LEXICON)
+
+
+def target_letter_for_category(category: str) -> str:
+    return CATEGORY_TARGET_LETTERS.get(category, 'r')
+
+
+def sound_for_letter(letter: str) -> str:
+    sound = LETTER_SOUNDS.get(letter.lower())
+    if sound is None:
+        raise ValueError(f"Unsupported target letter: {letter}")
+    return sound
+
+
+def parse_score(value) -> int | float | None:
+    # Scores arrive as JSON numbers or numeric strings ("5"), returns None for anything else
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        score = float(value)
+    except ValueError:
+        return None
+    if not math.isfinite(score):
+        return None
+    return int(score) if score.is_integer() else score
+
+
+def reading_level_for_score(score: int) -> int:
+    # Scores run from 1 to 10, lower scores get simpler words
+    if score <= 3:
+        return 1
+    if score <= 6:
+        return 2
+    return 3
+
+
+def _fill_template(template: str, name: str, target_sound: str, reading_level: int, rng: random.Random,
+                   lexicon: Lexicon, target_ratio: float) -> str:
+    def choose(match):
+        pos = match.group(1)
+        if pos == "name":
+            return name
+        target_words = lexicon.words(pos, reading_level, target_sound)
+        if target_words and rng.random() < target_ratio:
+            return rng.choice(target_words)
+        return rng.choice(lexicon.words(pos, reading_level) or target_words)
+
+    sentence = _SLOT_PATTERN.sub(choose, template)
+    sentence = re.sub(r"\b([Aa]) ([aeiou])", r"\1n \2", sentence)
+    return sentence[0].upper() + sentence[1:]
+
+
+def generate_local_story(score: int, target_letter: str = 'r', name: str = 'Janelle', max_words: int = 100,
+                         target_ratio: float = 0.8, seed: int = None, lexicon: Lexicon = DEFAULT_LEXICON) -> str:
+    target_sound = sound_for_letter(target_letter)
+    reading_level = reading_level_for_score(score)
+    rng = random.Random(seed if seed is not None else f"{score}:{target_sound}:{name}")
+
+    closing = _fill_template(CLOSING_TEMPLATE, name, target_sound, reading_level, rng, lexicon, target_ratio)
+    sentences = [_fill_template(OPENING_TEMPLATE, name, target_sound, reading_level, rng, lexicon, target_ratio)]
+    word_count = len(sentences[0].split()) + len(closing.split())
+
+    # Shuffle the templates so sentences do not repeat before every template was used once
+    templates: list[str] = []
+    while True:
+        if not templates:
+            templates = rng.sample(STORY_TEMPLATES, len(STORY_TEMPLATES))
+        sentence = _fill_template(templates.pop(), name, target_sound, reading_level, rng, lexicon, target_ratio)
+        if word_count + len(sentence.split()) > max_words:
+            break
+        sentences.append(sentence)
+        word_count += len(sentence.split())
+
+    sentences.append(closing)
+    story = " ".join(sentences)
+    logging.info(f"Generated local story with {word_count} words targeting '{target_sound}' at reading level {reading_level}")
+    return story
+
+
+def story_stats(story: str, target_letter: str, lexicon: Lexicon = DEFAULT_LEXICON) -> dict[str, any]:
+    # target_words counts words starting with the letter's sound, so "kite" counts for 'c' and "city" does not
+    target_sound = sound_for_letter(target_letter)
+    words = re.findall(r"[A-Za-z']+", story)
+    sentences = [sentence for sentence in re.split(r"(?<=[.!?])\s+", story.strip()) if sentence]
+    return {
+        "words": len(words),
+        "target_words": sum(lexicon.sound_of(word) == target_sound for word in words),
+        "sentence_lengths": [len(sentence.split()) for sentence in sentences]
+    }
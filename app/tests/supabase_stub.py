@@ -0,0 +1,127 @@
+import re
+import time
+from types import SimpleNamespace
+
+# In-memory stand-in for the supabase query builder, shared by the tests that talk to the database.
+# Supports the calls SkillData, DatabaseGuard and score_export make: select/insert/update with
+# eq/match/gt/gte/lte/in_/imatch filters, order and limit.
+
+
+class StubQuery:
+
+    def __init__(self, client, table_name: str):
+        self.client = client
+        self.table_name = table_name
+        self.action = "select"
+        self.payload = None
+        self.filters: list[tuple[str, str, any]] = []
+        self.order_column = None
+        self.descending = False
+        self.row_limit = None
+
+    def select(self, columns):
+        self.action = "select"
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values):
+        self.action, self.payload = "update", values
+        return self
+
+    def match(self, filters):
+        self.filters.extend(("eq", column, value) for column, value in filters.items())
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(("gt", column, value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(("gte", column, value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(("lte", column, value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(("in", column, list(values)))
+        return self
+
+    def filter(self, column, operator, value):
+        self.filters.append((operator, column, value))
+        return self
+
+    def order(self, column, desc=False):
+        self.order_column, self.descending = column, desc
+        return self
+
+    def limit(self, row_limit):
+        self.row_limit = row_limit
+        return self
+
+    def _matches(self, row) -> bool:
+        for operator, column, value in self.filters:
+            if operator == "eq" and row.get(column) != value:
+                return False
+            if operator == "gt" and not row[column] > value:
+                return False
+            if operator == "gte" and not row[column] >= value:
+                return False
+            if operator == "lte" and not row[column] <= value:
+                return False
+            if operator == "in" and row.get(column) not in value:
+                return False
+            if operator == "imatch" and not re.match(value, row[column], re.IGNORECASE):
+                return False
+        return True
+
+    def execute(self):
+        self.client.calls.append((self.table_name, self.action))
+        if self.client.error is not None:
+            raise self.client.error
+        if self.client.delay:
+            time.sleep(self.client.delay)
+        table = self.client.tables.setdefault(self.table_name, [])
+        if self.action == "insert":
+            id_column = self.client.id_columns.get(self.table_name)
+            inserted = []
+            for row in self.payload:
+                row = dict(row)
+                if id_column:
+                    row[id_column] = len(table) + 1
+                table.append(row)
+                inserted.append(row)
+            return SimpleNamespace(data=inserted)
+        matching = [row for row in table if self._matches(row)]
+        if self.action == "update":
+            for row in matching:
+                row.update(self.payload)
+            return SimpleNamespace(data=matching)
+        if self.order_column:
+            matching = sorted(matching, key=lambda row: row[self.order_column], reverse=self.descending)
+        return SimpleNamespace(data=matching[:self.row_limit] if self.row_limit is not None else matching)
+
+
+class StubClient:
+
+    # error is raised by every execute() while it is set, delay slows every call down
+    def __init__(self, tables: dict[str, list[dict[str, any]]] = None, id_columns: dict[str, str] = None):
+        self.tables: dict[str, list[dict[str, any]]] = tables if tables is not None else {}
+        self.id_columns: dict[str, str] = id_columns if id_columns is not None else {"users": "user_id"}
+        self.queries: list[StubQuery] = []
+        self.calls: list[tuple[str, str]] = []
+        self.error: Exception = None
+        self.delay: float = 0.0
+
+    def from_(self, table_name: str) -> StubQuery:
+        query = StubQuery(self, table_name)
+        self.queries.append(query)
+        return query
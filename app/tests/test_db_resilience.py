@@ -0,0 +1,179 @@
+import os
+import time
+import tempfile
+import unittest
+from types import SimpleNamespace
+from app.services.db_resilience import CircuitBreaker, CircuitOpenError, DatabaseGuard, SpillJournal, is_transient_error
+from app.tests.supabase_stub import StubClient
+
+
+class ApiError(Exception):
+    """Shaped like postgrest's APIError, which carries the PostgREST or SQLSTATE code."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_closed_open_half_open_closed(self):
+        """The breaker opens after the threshold, lets one trial through after the timeout and closes on success."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        self.assertTrue(breaker.allow_request())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.can_attempt())
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_failed_trial_reopens(self):
+        """A failing half-open trial opens the breaker again."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class TestTransientErrors(unittest.TestCase):
+    def test_outages_are_transient(self):
+        """Timeouts, connection errors, 5xx and PostgREST connection codes count as outages."""
+        for error in (TimeoutError(), ConnectionError(), CircuitOpenError(), ApiError("PGRST001"), ApiError("57014"),
+                      ApiError("503"), ApiError(502)):
+            self.assertTrue(is_transient_error(error), error)
+        response_error = Exception("bad gateway")
+        response_error.response = SimpleNamespace(status_code=502)
+        self.assertTrue(is_transient_error(response_error))
+
+    def test_rejections_and_bugs_are_not_transient(self):
+        """4xx responses, constraint violations and programming errors fail the same way on every retry."""
+        for error in (ApiError("42703"), ApiError("23505"), ApiError("PGRST204"), ApiError("400"), KeyError("id"), ValueError()):
+            self.assertFalse(is_transient_error(error), error)
+
+
+class TestDatabaseGuard(unittest.TestCase):
+    def setUp(self):
+        """Guard a stub client with a journal in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.client = StubClient()
+        self.journal = SpillJournal(os.path.join(self.directory.name, 'journal.sqlite3'), max_attempts=3)
+        self.guard = DatabaseGuard(self.client, CircuitBreaker(failure_threshold=1, reset_timeout=60), self.journal, call_timeout=0.5)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def attempts(self):
+        connection = self.journal._connect()
+        try:
+            return [attempts for (attempts,) in connection.execute("SELECT attempts FROM journal ORDER BY id")]
+        finally:
+            connection.close()
+
+    def test_spill_then_replay(self):
+        """Writes that fail are journaled and replayed once the database is back."""
+        self.client.error = ConnectionError("database unavailable")
+        rows = [{"user_id": 1, "skill_name_id": "PhAw1", "skill_value": 1}]
+        query = self.client.from_("skill_scores").insert(rows)
+
+        self.assertIsNone(self.guard.write("skill_scores", "upsert", rows, query, "user_id,skill_name_id"))
+        self.assertEqual(self.journal.depth(), {"pending": 1, "dead": 0})
+
+        self.client.error = None
+        self.guard.breaker.record_success()
+        self.assertEqual(self.guard.replay(), 1)
+        self.assertEqual(self.client.tables["skill_scores"], rows)
+        self.assertEqual(self.journal.depth(), {"pending": 0, "dead": 0})
+
+    def test_replay_after_timeout_does_not_duplicate(self):
+        """A write that timed out but still landed is not inserted a second time on replay."""
+        self.client.delay = 0.2
+        self.guard.call_timeout = 0.05
+        rows = [{"user_id": 1, "domain": "language_and_literacy", "category": "writing", "total_questions": 2, "correct_answers": 1,
+                 "created_at": "2024-01-01T10:00:00+00:00"}]
+        key_columns = "user_id,domain,category,created_at"
+
+        self.guard.write("category_scores", "insert_missing", rows, self.client.from_("category_scores").insert(rows), key_columns)
+        time.sleep(0.3)
+        self.client.delay = 0.0
+        self.guard.breaker.record_success()
+
+        self.assertEqual(self.guard.replay(), 1)
+        self.assertEqual(len(self.client.tables["category_scores"]), 1)
+
+    def test_identical_rescreening_is_kept(self):
+        """Two submissions with the same results but different submission times are both replayed."""
+        snapshot = {"user_id": 1, "domain": "language_and_literacy", "category": "writing", "total_questions": 2, "correct_answers": 1}
+        key_columns = "user_id,domain,category,created_at"
+        self.journal.append("category_scores", "insert_missing", [dict(snapshot, created_at="2024-01-01T10:00:00+00:00")], key_columns)
+        self.journal.append("category_scores", "insert_missing", [dict(snapshot, created_at="2024-01-02T10:00:00+00:00")], key_columns)
+
+        self.assertEqual(self.guard.replay(), 2)
+        self.assertEqual(len(self.client.tables["category_scores"]), 2)
+
+    def test_rejected_write_is_raised_not_spilled(self):
+        """A 4xx-style rejection is raised to the caller and neither trips the breaker nor fills the journal."""
+        self.client.error = ApiError("42703")
+        rows = [{"user_id": 1, "skill_name_id": "PhAw1", "skill_value": 1}]
+
+        with self.assertRaises(ApiError):
+            self.guard.write("skill_scores", "upsert", rows, self.client.from_("skill_scores").insert(rows), "user_id,skill_name_id")
+        self.assertEqual(self.guard.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.journal.depth(), {"pending": 0, "dead": 0})
+
+    def test_plain_insert_is_not_spilled(self):
+        """Only operations that are safe to replay twice can go into the journal."""
+        with self.assertRaises(ValueError):
+            self.guard.write("category_scores", "insert", [{"user_id": 1}])
+
+    def test_failed_replay_counts_attempt(self):
+        """A replay that fails on the database increases the entry's attempts."""
+        self.journal.append("users", "insert_missing", [{"email": "a@b.com"}], "email")
+        self.client.error = ConnectionError("database unavailable")
+
+        self.assertEqual(self.guard.replay(), 0)
+        self.assertEqual(self.attempts(), [1])
+        self.assertEqual(self.journal.depth(), {"pending": 1, "dead": 0})
+
+    def test_open_breaker_during_replay_does_not_count_attempt(self):
+        """An open breaker says nothing about the entry, so attempts stay the same."""
+        self.journal.append("users", "insert_missing", [{"email": "a@b.com"}], "email")
+        self.guard.breaker.record_failure()
+
+        self.assertEqual(self.guard.replay(), 0)
+        self.assertEqual(self.attempts(), [0])
+        with self.assertRaises(CircuitOpenError):
+            self.guard.execute(self.client.from_("users").select("user_id"))
+
+    def test_rows_are_linked_to_user_spilled_earlier(self):
+        """Rows spilled without a user_id get the id of the user created earlier in the same replay."""
+        self.journal.append("users", "insert_missing", [{"email": "a@b.com"}], "email", "a@b.com")
+        self.journal.append("skill_scores", "upsert", [{"user_id": None, "skill_name_id": "AK1", "skill_value": 0}],
+                            "user_id,skill_name_id", "a@b.com")
+
+        self.assertEqual(self.guard.replay(), 2)
+        user_id = self.client.tables["users"][0]["user_id"]
+        self.assertEqual(self.client.tables["skill_scores"], [{"user_id": user_id, "skill_name_id": "AK1", "skill_value": 0}])
+
+    def test_replaying_user_twice_creates_one_user(self):
+        """Replaying the same user twice keeps a single users row."""
+        self.journal.append("users", "insert_missing", [{"email": "a@b.com"}], "email")
+        self.journal.append("users", "insert_missing", [{"email": "a@b.com"}], "email")
+
+        self.assertEqual(self.guard.replay(), 2)
+        self.assertEqual(len(self.client.tables["users"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from app.services.exercise_recommendations import ExerciseIndex
+
+
+class TestExerciseIndex(unittest.TestCase):
+    def setUp(self):
+        """Build a small index so the ranking is easy to follow."""
+        self.index = ExerciseIndex([
+            {"exercise_id": "rhyme", "title": "Rhyme", "domain": "language_and_literacy", "category": "phonological_awareness", "skills": ["phaw1"]},
+            {"exercise_id": "clap", "title": "Clap", "domain": "language_and_literacy", "category": "phonological_awareness", "skills": ["phaw2"]},
+            {"exercise_id": "letters", "title": "Letters", "domain": "language_and_literacy", "category": "alphabet_knowledge", "skills": ["ak1"]},
+        ])
+
+    def test_missed_skills_rank_first(self):
+        """Exercises targeting a missed skill come before category-only matches."""
+        skill_values = {"language_and_literacy": {"phonological_awareness": {"phaw1": 1, "phaw2": 0}}}
+        scores = {"language_and_literacy": {"phonological_awareness": {"total_questions": 2, "correct_answers": 1}}}
+
+        plan = self.index.recommend(scores, skill_values)
+
+        self.assertEqual([entry["exercise_id"] for entry in plan], ["clap", "rhyme"])
+        self.assertEqual(plan[0]["targeted_skills"], ["phaw2"])
+
+    def test_no_gaps_returns_empty_plan(self):
+        """A child who answered everything correctly gets no exercises."""
+        skill_values = {"language_and_literacy": {"alphabet_knowledge": {"ak1": 1}}}
+        scores = {"language_and_literacy": {"alphabet_knowledge": {"total_questions": 1, "correct_answers": 1}}}
+
+        self.assertEqual(self.index.recommend(scores, skill_values), [])
+
+    def test_recommend_for_users(self):
+        """Batch mode builds one plan per user from the raw skill values."""
+        plans = self.index.recommend_for_users({
+            1: {"language_and_literacy": {"alphabet_knowledge": {"ak1": 0}}},
+            2: {"language_and_literacy": {"alphabet_knowledge": {"ak1": 1}}},
+        })
+
+        self.assertEqual([entry["exercise_id"] for entry in plans[1]], ["letters"])
+        self.assertEqual(plans[2], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import time
+import threading
+import unittest
+import numpy as np
+from app.services.irt_scoring import fit_item_parameters, estimate_abilities, build_response_matrix, get_model, clear_model_cache, cached_model, start_model_refresher
+
+
+class TestIrtScoring(unittest.TestCase):
+    def setUp(self):
+        """Simulate Rasch responses with known abilities and difficulties."""
+        rng = np.random.default_rng(7)
+        self.theta = rng.normal(size=2000)
+        self.difficulty = np.linspace(-2, 2, 20)
+        probability = 1 / (1 + np.exp(-(self.theta[:, None] - self.difficulty)))
+        self.responses = (rng.random(probability.shape) < probability).astype(float)
+        self.responses[rng.random(probability.shape) < 0.2] = np.nan
+
+    def test_fit_recovers_difficulty(self):
+        """Fitted difficulties follow the simulated ones."""
+        difficulty, discrimination = fit_item_parameters(self.responses, "rasch")
+
+        self.assertGreater(np.corrcoef(difficulty, self.difficulty)[0, 1], 0.95)
+        self.assertTrue(np.all(discrimination == 1.0))
+
+    def test_2pl_fit_recovers_scale(self):
+        """2PL difficulties and discriminations come out on the simulated scale, not shrunk and inflated."""
+        rng = np.random.default_rng(11)
+        theta = rng.normal(size=2000)
+        difficulty = np.linspace(-2, 2, 30)
+        discrimination = rng.uniform(0.6, 1.8, size=30)
+        probability = 1 / (1 + np.exp(-discrimination * (theta[:, None] - difficulty)))
+        responses = (rng.random(probability.shape) < probability).astype(float)
+
+        fitted_difficulty, fitted_discrimination = fit_item_parameters(responses, "2pl")
+
+        self.assertAlmostEqual(np.polyfit(difficulty, fitted_difficulty, 1)[0], 1.0, delta=0.15)
+        self.assertAlmostEqual(fitted_discrimination.mean(), discrimination.mean(), delta=0.2)
+        self.assertGreater(np.corrcoef(discrimination, fitted_discrimination)[0, 1], 0.9)
+
+    def test_abilities_are_finite_for_perfect_scores(self):
+        """The prior keeps all-correct and all-wrong respondents finite and ordered."""
+        responses = np.array([[1.0] * 5, [0.0] * 5, [1.0, 1.0, 0.0, np.nan, 0.0]])
+        theta, standard_error = estimate_abilities(responses, np.zeros(5), np.ones(5))
+
+        self.assertTrue(np.all(np.isfinite(theta)))
+        self.assertGreater(theta[0], theta[2])
+        self.assertGreater(theta[2], theta[1])
+        self.assertTrue(np.all(standard_error > 0))
+
+    def test_build_response_matrix(self):
+        """Missing skills become NaN, answered ones 0 or 1."""
+        user_ids, item_ids, matrix = build_response_matrix({
+            "a": {"language_and_literacy": {"writing": {"wr1": 1, "wr2": 0}}},
+            "b": {"language_and_literacy": {"writing": {"wr2": 1}}},
+        })
+
+        self.assertEqual(item_ids, ["wr1", "wr2"])
+        np.testing.assert_array_equal(matrix, np.array([[1.0, 0.0], [np.nan, 1.0]]))
+
+
+class TestModelCache(unittest.TestCase):
+    def setUp(self):
+        """Count how often the skill values are loaded."""
+        clear_model_cache()
+        self.loads = 0
+        self.skill_values = {"a": {"language_and_literacy": {"writing": {"wr1": 1, "wr2": 0}}}}
+
+    def tearDown(self):
+        clear_model_cache()
+
+    def load(self):
+        self.loads += 1
+        return self.skill_values
+
+    def test_model_is_cached(self):
+        """A fresh model is reused without loading the skill values again."""
+        first = get_model(self.load, "rasch", max_age=60)
+
+        self.assertIs(get_model(self.load, "rasch", max_age=60), first)
+        self.assertEqual(self.loads, 1)
+
+    def test_stale_model_is_refitted(self):
+        """A model older than max_age is fitted again."""
+        get_model(self.load, "rasch", max_age=60)
+        get_model(self.load, "rasch", max_age=0)
+
+        self.assertEqual(self.loads, 2)
+
+    def test_empty_fit_is_not_cached(self):
+        """A fit without any items is retried on the next call."""
+        self.skill_values = {}
+        self.assertEqual(get_model(self.load, "rasch").item_ids, [])
+
+        self.skill_values = {"a": {"language_and_literacy": {"writing": {"wr1": 1}}}}
+        self.assertEqual(get_model(self.load, "rasch").item_ids, ["wr1"])
+        self.assertEqual(self.loads, 2)
+
+
+    def test_refresher_warms_cache_once_per_process(self):
+        """The refresher fits in the background, cached_model never fits and a second start is a no-op."""
+        self.assertIsNone(cached_model("rasch"))
+        loaded = threading.Event()
+
+        def load():
+            self.loads += 1
+            loaded.set()
+            return self.skill_values
+
+        refresher = start_model_refresher(load, "rasch", interval=60)
+        self.assertIs(start_model_refresher(load, "rasch", interval=60), refresher)
+        loaded.wait(5)
+        for _ in range(100):
+            if cached_model("rasch") is not None:
+                break
+            time.sleep(0.01)
+        self.assertEqual(cached_model("rasch").item_ids, ["wr1", "wr2"])
+        self.assertEqual(self.loads, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
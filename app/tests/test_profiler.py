@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from collections import Counter
+from flask import Flask
+from app.utils.profiler import ProfileStore, init_profiling, should_profile
+
+
+class TestProfileStore(unittest.TestCase):
+    def setUp(self):
+        """Use a temporary directory as the profile ring."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ProfileStore(os.path.join(self.directory.name, 'profiles'), max_profiles=3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_ring_keeps_newest_profiles(self):
+        """Only the newest max_profiles profiles are kept."""
+        profile_ids = [self.store.save('/calculate_score', 'POST', 10, 1.0, Counter({"a;b": 1})) for _ in range(5)]
+
+        listed = [profile["id"] for profile in self.store.list_profiles()]
+        self.assertEqual(listed, list(reversed(profile_ids[2:])))
+        self.assertIsNone(self.store.get_profile(profile_ids[0]))
+        self.assertEqual(self.store.get_profile(profile_ids[-1])["stacks"], "a;b 1")
+
+    def test_get_profile_rejects_path_traversal(self):
+        """Ids containing path separators are never opened."""
+        with open(os.path.join(self.directory.name, 'outside.json'), 'w') as f:
+            f.write('{}')
+        self.assertIsNone(self.store.get_profile('../outside'))
+        self.assertIsNone(self.store.get_profile('/etc/passwd'))
+
+
+class TestProfilingHooks(unittest.TestCase):
+    def test_disabled_registers_no_hooks(self):
+        """With PROFILING_ENABLED unset nothing runs per request."""
+        app = Flask(__name__)
+        init_profiling(app)
+
+        self.assertIsNone(app.profile_store)
+        self.assertFalse(any(app.before_request_funcs.values()))
+        self.assertFalse(any(app.teardown_request_funcs.values()))
+
+    def test_header_requires_admin_token(self):
+        """The profiling header is ignored unless X-Admin-Token matches."""
+        app = Flask(__name__)
+        app.config['PROFILING_ADMIN_TOKEN'] = 'secret'
+
+        with app.test_request_context(headers={'X-Profile-Request': '1'}):
+            self.assertFalse(should_profile('X-Profile-Request', 0.0))
+        with app.test_request_context(headers={'X-Profile-Request': '1', 'X-Admin-Token': 'wrong'}):
+            self.assertFalse(should_profile('X-Profile-Request', 0.0))
+        with app.test_request_context(headers={'X-Profile-Request': '1', 'X-Admin-Token': 'secret'}):
+            self.assertTrue(should_profile('X-Profile-Request', 0.0))
+
+    def test_header_ignored_without_configured_token(self):
+        """Without a configured token the header never forces a profile."""
+        app = Flask(__name__)
+        with app.test_request_context(headers={'X-Profile-Request': '1', 'X-Admin-Token': ''}):
+            self.assertFalse(should_profile('X-Profile-Request', 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import re
+import unittest
+from app.services.score_export import iter_table, skill_name_pattern, to_ndjson, to_csv, export_rows, EXPORT_COLUMNS
+from app.tests.supabase_stub import StubClient
+
+
+class TestScoreExport(unittest.TestCase):
+    def setUp(self):
+        """Seven skill_scores rows for two users."""
+        skill_names = ["PhAw1", "AK1", "PhAw2", "Wri1", "PhAw3", "AK2", "PrKn1"]
+        self.rows = [
+            {"id": row_id, "user_id": 1 + row_id % 2, "skill_name_id": skill_name, "skill_value": 1, "created_at": "2024-01-01"}
+            for row_id, skill_name in enumerate(skill_names, start=1)
+        ]
+
+    def test_keyset_paging_reads_every_row_once(self):
+        """Pages continue after the last id seen and stop on a short page."""
+        client = StubClient({"skill_scores": self.rows})
+        exported = list(iter_table(client, "skill_scores", page_size=3))
+
+        self.assertEqual([row["id"] for row in exported], list(range(1, 8)))
+        self.assertEqual(len(client.queries), 3)
+        self.assertEqual(client.queries[1].filters, [("gt", "id", 3)])
+        self.assertEqual(client.queries[2].filters, [("gt", "id", 6)])
+
+    def test_full_last_page_ends_with_empty_page(self):
+        """When the rows divide evenly into pages one more empty page ends the export."""
+        client = StubClient({"skill_scores": self.rows[:6]})
+
+        self.assertEqual(len(list(iter_table(client, "skill_scores", page_size=3))), 6)
+        self.assertEqual(len(client.queries), 3)
+
+    def test_invalid_page_size_is_rejected(self):
+        """A page size below one would never advance the keyset."""
+        with self.assertRaises(ValueError):
+            list(iter_table(StubClient({"skill_scores": self.rows}), "skill_scores", page_size=0))
+
+    def test_category_filter_matches_skill_name_prefix(self):
+        """The category filter on skill_scores keeps only skill ids with that category's prefix."""
+        exported = list(iter_table(StubClient({"skill_scores": self.rows}), "skill_scores", category="phonological_awareness", page_size=2))
+
+        self.assertEqual([row["skill_name_id"] for row in exported], ["PhAw1", "PhAw2", "PhAw3"])
+
+    def test_skill_name_pattern(self):
+        """The pattern matches the prefix followed by digits only."""
+        pattern = skill_name_pattern("phonological_awareness")
+
+        self.assertTrue(re.match(pattern, "PhAw12", re.IGNORECASE))
+        self.assertFalse(re.match(pattern, "PhAwX", re.IGNORECASE))
+        self.assertFalse(re.match(pattern, "AK1", re.IGNORECASE))
+        with self.assertRaises(ValueError):
+            skill_name_pattern("not_a_category")
+
+    def test_ndjson_has_one_object_per_line(self):
+        """Every row becomes one JSON line."""
+        lines = list(to_ndjson(self.rows[:2]))
+
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all(line.endswith("\n") for line in lines))
+        self.assertEqual(json.loads(lines[0]), self.rows[0])
+
+    def test_csv_has_header_and_export_columns(self):
+        """CSV output starts with the header and ignores columns that are not exported."""
+        rows = [dict(row, extra="ignored") for row in self.rows[:2]]
+        chunks = list(to_csv(rows, EXPORT_COLUMNS["skill_scores"]))
+
+        parsed = list(csv.DictReader(io.StringIO("".join(chunks))))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(list(parsed[0]), EXPORT_COLUMNS["skill_scores"])
+        self.assertEqual(parsed[1]["skill_name_id"], "AK1")
+
+    def test_csv_without_rows_still_has_header(self):
+        """An empty export is just the header line."""
+        self.assertEqual("".join(to_csv([], ["id", "user_id"])), "id,user_id\r\n")
+
+
+    def interrupted_rows(self):
+        """Three rows, then the database fails while the next page is fetched."""
+        client = StubClient({"skill_scores": self.rows})
+
+        def execute(query):
+            if len(client.queries) > 1:
+                raise TimeoutError("page timed out")
+            return query.execute()
+        return iter_table(client, "skill_scores", page_size=3, execute=execute)
+
+    def test_interrupted_ndjson_export_ends_with_error_record(self):
+        """A failure mid-stream ends the file with an error record naming the last exported id."""
+        lines = list(export_rows(self.interrupted_rows(), "skill_scores", "ndjson"))
+
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(json.loads(lines[-1]), {"export_error": "TimeoutError", "rows_exported": 3, "last_id": 3})
+
+    def test_interrupted_csv_export_ends_with_error_line(self):
+        """CSV exports end with a marker line the client can check."""
+        chunks = list(export_rows(self.interrupted_rows(), "skill_scores", "csv"))
+
+        self.assertEqual(chunks[-1], "#export_error=TimeoutError,rows_exported=3,last_id=3\r\n")
+
+    def test_interrupted_export_can_raise(self):
+        """The CLI asks for the error instead of a record so it exits with a failure."""
+        with self.assertRaises(TimeoutError):
+            list(export_rows(self.interrupted_rows(), "skill_scores", "ndjson", error_record=False))
+
+    def test_complete_export_has_no_error_record(self):
+        """A finished export holds only the rows."""
+        lines = list(export_rows(iter_table(StubClient({"skill_scores": self.rows}), "skill_scores", page_size=3), "skill_scores", "ndjson"))
+
+        self.assertEqual([json.loads(line)["id"] for line in lines], list(range(1, 8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
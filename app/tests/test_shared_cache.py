@@ -0,0 +1,70 @@
+import os
+import time
+import tempfile
+import unittest
+from app.utils.shared_cache import SharedCache
+
+
+class TestSharedCache(unittest.TestCase):
+    def setUp(self):
+        """Map a small cache file in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'shared_cache.bin')
+        self.cache = SharedCache(self.path, capacity=16, key_size=32, value_size=64, stats_flush_every=1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_set_and_get(self):
+        """Values round-trip through JSON and missing keys return the default."""
+        self.assertTrue(self.cache.set("report:1", {"scores": [1, 2]}))
+        self.assertEqual(self.cache.get("report:1"), {"scores": [1, 2]})
+        self.assertEqual(self.cache.get("report:2", "missing"), "missing")
+
+    def test_ttl_expiry(self):
+        """Expired entries are treated as misses."""
+        self.cache.set("story:5", "Once upon a time", ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get("story:5"))
+
+    def test_oversized_values_are_rejected(self):
+        """Values larger than a slot are not stored."""
+        self.assertFalse(self.cache.set("story:1", "r" * 100))
+        self.assertEqual(self.cache.stats()["worker"]["oversize"], 1)
+
+    def test_eviction_keeps_capacity(self):
+        """Writing more keys than slots evicts instead of failing."""
+        for i in range(100):
+            self.assertTrue(self.cache.set(f"user:{i}", i))
+        stored = sum(self.cache.get(f"user:{i}") is not None for i in range(100))
+        self.assertLessEqual(stored, self.cache.capacity)
+        self.assertGreater(self.cache.stats()["global"]["evictions"], 0)
+
+    def test_pinned_entry_survives_eviction(self):
+        """A pinned entry stays while other keys fill and evict every slot."""
+        self.assertTrue(self.cache.set("send_to_java", {"a": 1}, ttl=0, pinned=True))
+        for i in range(100):
+            self.cache.set(f"user:{i}", i)
+        self.assertEqual(self.cache.get("send_to_java"), {"a": 1})
+
+    def test_full_pinned_bucket_rejects_new_pinned_keys(self):
+        """When every slot of a bucket is pinned, set reports that the value was not stored."""
+        cache = SharedCache(os.path.join(self.directory.name, 'pinned.bin'), capacity=8, key_size=32, value_size=64)
+        for i in range(8):
+            self.assertTrue(cache.set(f"pin:{i}", i, ttl=0, pinned=True))
+        self.assertFalse(cache.set("pin:8", 8, ttl=0, pinned=True))
+        self.assertFalse(cache.set("user:1", 1))
+        self.assertTrue(cache.set("pin:3", 33, ttl=0, pinned=True))
+
+    def test_second_mapping_shares_entries(self):
+        """A second mapping of the same file (another worker) sees the same entries and global stats."""
+        self.cache.set("user:a@b.com", 42)
+        other_worker = SharedCache(self.path, capacity=16, key_size=32, value_size=64, stats_flush_every=1)
+
+        self.assertEqual(other_worker.get("user:a@b.com"), 42)
+        self.assertEqual(other_worker.stats()["worker"]["hits"], 1)
+        self.assertEqual(self.cache.stats()["global"]["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+from app.services.skill_data import SkillData
+from app.tests.supabase_stub import StubClient
+
+
+def skill_data_with(client: StubClient, cache=None) -> SkillData:
+    with mock.patch("app.services.skill_data.create_client"):
+        skill_data = SkillData(cache=cache)
+    skill_data.supabase = client
+    return skill_data
+
+
+class TestIterUsers(unittest.TestCase):
+    def setUp(self):
+        """Five users, four of them with stored skill values."""
+        self.client = StubClient({
+            "users": [{"user_id": user_id, "email": f"{user_id}@b.com"} for user_id in range(1, 6)],
+            "skill_scores": [
+                {"id": row_id, "user_id": user_id, "skill_name_id": skill_name_id, "skill_value": row_id % 2, "created_at": "2024-01-01"}
+                for row_id, (user_id, skill_name_id) in enumerate([(1, "PhAw1"), (2, "AK1"), (4, "PhAw1"), (1, "AK2"), (5, "Wr1")], start=1)
+            ]
+        })
+
+    def test_every_user_with_scores_once(self):
+        """Users come out in user_id order with all their skills, users without scores are skipped."""
+        users = list(skill_data_with(self.client).iter_users_from_db(batch_size=2))
+
+        self.assertEqual([user_id for user_id, _ in users], [1, 2, 4, 5])
+        self.assertEqual(users[0][1], {"language_and_literacy": {"phonological_awareness": {"phaw1": 1}, "alphabet_knowledge": {"ak2": 0}}})
+
+    def test_users_are_loaded_in_batches(self):
+        """Each batch reads one page of users and only that batch's skill rows."""
+        list(skill_data_with(self.client).iter_users_from_db(batch_size=2))
+
+        user_pages = [query for query in self.client.queries if query.table_name == "users"]
+        self.assertEqual(len(user_pages), 3)
+        skill_pages = [query for query in self.client.queries if query.table_name == "skill_scores"]
+        self.assertEqual([filters for filters in skill_pages[0].filters if filters[0] == "in"], [("in", "user_id", [1, 2])])
+
+
+class DictCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+class TestInitializeUser(unittest.TestCase):
+    def setUp(self):
+        """SkillData with a stub users table and a plain dict cache."""
+        self.client = StubClient({"users": [{"user_id": 1, "email": "a@b.com"}]})
+        self.cache = DictCache()
+        self.skill_data = skill_data_with(self.client, self.cache)
+
+    def test_existing_user_is_found_and_cached(self):
+        """A cache miss looks the user up by email instead of creating a new one."""
+        self.assertEqual(self.skill_data.initialize_user_tmp("a@b.com"), 1)
+        self.assertEqual(len(self.client.tables["users"]), 1)
+        self.assertEqual(self.cache.get("user:a@b.com"), 1)
+
+    def test_new_user_is_created_and_cached(self):
+        """An unknown email creates the user once."""
+        self.assertEqual(self.skill_data.initialize_user_tmp("new@b.com"), 2)
+        self.assertEqual(self.skill_data.initialize_user_tmp("new@b.com"), 2)
+        self.assertEqual(len(self.client.tables["users"]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
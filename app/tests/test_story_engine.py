@@ -0,0 +1,53 @@
+import unittest
+from app.services.story_engine import generate_local_story, parse_score, story_stats, target_letter_for_category, sound_for_letter, LETTER_SOUNDS
+
+
+class TestStoryEngine(unittest.TestCase):
+    def test_story_meets_constraints(self):
+        """Stories stay under 100 words with 6-8 word sentences."""
+        for letter in ('r', 'b', 's', 'm', 't', 'w'):
+            for score in (1, 5, 9):
+                stats = story_stats(generate_local_story(score, letter), letter)
+                self.assertLessEqual(stats["words"], 100)
+                self.assertTrue(all(6 <= length <= 8 for length in stats["sentence_lengths"]))
+
+    def test_story_uses_target_letter_often(self):
+        """A large share of the words start with the target letter."""
+        stats = story_stats(generate_local_story(4, 'r'), 'r')
+        self.assertGreater(stats["target_words"] / stats["words"], 0.2)
+
+    def test_story_is_deterministic(self):
+        """The same score and letter give the same story, a different seed a different one."""
+        self.assertEqual(generate_local_story(4, 'r'), generate_local_story(4, 'r'))
+        self.assertNotEqual(generate_local_story(4, 'r', seed=1), generate_local_story(4, 'r', seed=2))
+
+    def test_target_letter_for_category(self):
+        """Categories map to a letter, unknown categories fall back to 'r'."""
+        self.assertEqual(target_letter_for_category('writing'), 'w')
+        self.assertEqual(target_letter_for_category('Unknown Category'), 'r')
+
+    def test_every_supported_letter_gets_target_words(self):
+        """Each supported letter is mapped to a sound the lexicon has words for."""
+        for letter in LETTER_SOUNDS:
+            stats = story_stats(generate_local_story(4, letter), letter)
+            self.assertGreater(stats["target_words"] / stats["words"], 0.15, letter)
+
+    def test_letters_map_to_sounds(self):
+        """'c' practices the /k/ sound and unsupported letters are rejected."""
+        self.assertEqual(sound_for_letter('C'), 'k')
+        self.assertEqual(story_stats("The cat saw a kite in the city.", 'c')["target_words"], 2)
+        with self.assertRaises(ValueError):
+            generate_local_story(4, 'z')
+
+
+    def test_parse_score(self):
+        """Numbers and numeric strings are accepted, everything else is rejected."""
+        self.assertEqual(parse_score("5"), 5)
+        self.assertEqual(parse_score(5.0), 5)
+        self.assertEqual(parse_score(" 4.5 "), 4.5)
+        for value in ("five", "", "nan", "inf", True, None, [5], {"score": 5}):
+            self.assertIsNone(parse_score(value), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,13 @@
+import hmac
+from flask import request, current_app
+
+# Shared check for admin-only endpoints and headers.
+# The caller must send X-Admin-Token matching the configured token; without a configured token access is denied.
+
+
+def admin_request_allowed(token_setting: str) -> bool:
+    token = current_app.config.get(token_setting)
+    provided = request.headers.get('X-Admin-Token')
+    if not token or not provided:
+        return False
+    return hmac.compare_digest(provided.encode(), token.encode())
@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import Counter
+from flask import request, g, current_app
+from .admin_auth import admin_request_allowed
+
+# Opt-in per-request profiling.
+# A request is profiled when an admin sends the profiling header (with X-Admin-Token) or it is picked by the sample rate.
+# Profiles are stored as collapsed stacks ("frame;frame;frame count" per line, flamegraph.pl format)
+# in a bounded on-disk ring so the newest PROFILING_RING_SIZE profiles are kept.
+
+
+class SamplingProfiler:
+
+    # Samples the stack of a single thread from a background thread.
+    # The profiled thread itself is never traced, so the overhead is one sys._current_frames() call per interval.
+
+    def __init__(self, thread_id: int, interval: float = 0.001, max_depth: int = 128):
+        self.thread_id: int = thread_id
+        self.interval: float = interval
+        self.max_depth: int = max_depth
+        self.stacks: Counter = Counter()
+        self.samples: int = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+
+    def _collapse(self, frame) -> str:
+        frames: list[str] = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        frames.reverse()
+        return ";".join(frames)
+
+
+class ProfileStore:
+
+    # Keeps at most max_profiles profile files in directory, oldest files are removed first.
+    # File names start with a nanosecond timestamp so sorting them sorts the ring.
+
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory: str = directory
+        self.max_profiles: int = max_profiles
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def save(self, route: str, method: str, payload_size: int, duration_ms: float, stacks: Counter) -> str:
+        profile_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        profile = {
+            "id": profile_id,
+            "route": route,
+            "method": method,
+            "payload_size": payload_size,
+            "duration_ms": round(duration_ms, 3),
+            "samples": sum(stacks.values()),
+            "created_at": time.time(),
+            "format": "collapsed",
+            "stacks": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        }
+        path = os.path.join(self.directory, f"{profile_id}.json")
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(profile, f)
+            os.replace(tmp_path, path)
+            self._evict()
+        return profile_id
+
+    def _profile_files(self) -> list[str]:
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def _evict(self) -> None:
+        files = self._profile_files()
+        for name in files[:max(len(files) - self.max_profiles, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def list_profiles(self) -> list[dict[str, any]]:
+        profiles = []
+        for name in reversed(self._profile_files()):
+            profile = self.get_profile(name[:-len(".json")])
+            if profile is None:
+                continue
+            profile.pop("stacks", None)
+            profiles.append(profile)
+        return profiles
+
+    def get_profile(self, profile_id: str) -> dict[str, any] | None:
+        # Profile ids are generated by save(), anything else could be a path traversal attempt
+        if os.path.basename(profile_id) != profile_id:
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+
+def should_profile(header_name: str, sample_rate: float) -> bool:
+    # The header is only honored for admins, otherwise any client could fill the ring and push out real profiles
+    if request.headers.get(header_name) and admin_request_allowed('PROFILING_ADMIN_TOKEN'):
+        return True
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def start_request_profile() -> None:
+    config = current_app.config
+    if not should_profile(config.get('PROFILING_HEADER', 'X-Profile-Request'), config.get('PROFILING_SAMPLE_RATE', 0.0)):
+        return
+    profiler = SamplingProfiler(threading.get_ident(), interval=config.get('PROFILING_INTERVAL', 0.001))
+    g.request_profiler = profiler
+    g.request_profile_start = time.perf_counter()
+    profiler.start()
+
+
+def finish_request_profile(error=None) -> None:
+    profiler = g.pop('request_profiler', None)
+    if profiler is None:
+        return
+    duration_ms = (time.perf_counter() - g.pop('request_profile_start')) * 1000
+    stacks = profiler.stop()
+    try:
+        profile_id = current_app.profile_store.save(
+            request.url_rule.rule if request.url_rule else request.path,
+            request.method,
+            request.content_length or 0,
+            duration_ms,
+            stacks
+        )
+        current_app.logger.info(f"Stored request profile {profile_id} for {request.path} ({duration_ms:.1f} ms)")
+    except OSError as e:
+        logging.error(f"Error storing request profile for {request.path}: {e}")
+
+
+def init_profiling(app) -> None:
+    # Nothing is registered when profiling is disabled, so requests pay no cost at all
+    app.profile_store = None
+    if not app.config.get('PROFILING_ENABLED', False):
+        return
+
+    app.profile_store = ProfileStore(
+        app.config.get('PROFILING_DIR') or os.path.join(app.instance_path, 'profiles'),
+        app.config.get('PROFILING_RING_SIZE', 50)
+    )
+    app.before_request(start_request_profile)
+    app.teardown_request(finish_request_profile)
@@ -0,0 +1,289 @@
+import os
+import json
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, waitress runs a single process there so thread locks are enough
+    fcntl = None
+
+# Cache shared by all worker processes through a memory-mapped file.
+# The file holds a fixed-size open-addressing hash table split into buckets of BUCKET_SIZE slots.
+# A key only ever lives in its own bucket, so writers lock one stripe of buckets (a thread lock plus an
+# fcntl byte-range lock for other processes) and never touch slots another stripe owns.
+# Readers take no lock: every slot has a version counter that writers make odd while they write
+# (a seqlock), and a reader retries when the version changed under it.
+# Entries expire after their TTL, and a full bucket evicts its least recently used slot.
+# Pinned entries are never evicted, they are meant for a few fixed keys whose loss would make workers disagree.
+# Create it in create_app so a preloading gunicorn master maps the file once and the workers inherit it.
+
+MAGIC = b"KRCACHE1"
+HEADER = struct.Struct("<8sQQQ")                 # magic, capacity, key_size, value_size
+COUNTERS = struct.Struct("<QQQQ")                # hits, misses, sets, evictions
+COUNTER_NAMES = ("hits", "misses", "sets", "evictions")
+COUNTERS_OFFSET = 64
+TABLE_OFFSET = 128
+SLOT_HEADER = struct.Struct("<IB3xQddH2xI")      # version, state, key_hash, expires_at, last_access, key_len, value_len
+VERSION = struct.Struct("<I")
+LAST_ACCESS_OFFSET = 24
+
+EMPTY = 0
+USED = 1
+PINNED = 2
+OCCUPIED = (USED, PINNED)
+
+BUCKET_SIZE = 8
+LOCK_STRIPES = 64
+INIT_LOCK_BYTE = 0
+COUNTERS_LOCK_BYTE = 1
+STRIPE_LOCK_BYTE = 2
+
+
+class SharedCache:
+
+    def __init__(self, path: str, capacity: int = 2048, key_size: int = 128, value_size: int = 4096, default_ttl: float = 3600.0,
+                 stats_flush_every: int = 100):
+        self.path: str = path
+        self.key_size: int = key_size
+        self.value_size: int = value_size
+        self.default_ttl: float = default_ttl
+        self.bucket_count: int = max(capacity // BUCKET_SIZE, 1)
+        self.capacity: int = self.bucket_count * BUCKET_SIZE
+        self.slot_size: int = (SLOT_HEADER.size + key_size + value_size + 7) // 8 * 8
+        self.size: int = TABLE_OFFSET + self.capacity * self.slot_size
+        self.stats_flush_every: int = stats_flush_every
+
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._counters_lock = threading.Lock()
+        self._global_counters_lock = threading.Lock()
+        self._worker_stats: dict[str, int] = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "oversize": 0}
+        self._unflushed: list[int] = [0, 0, 0, 0]
+        self._unflushed_ops: int = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._process_lock(INIT_LOCK_BYTE)
+        try:
+            self._initialize_file()
+            self._map = mmap.mmap(self._fd, self.size)
+        finally:
+            self._process_unlock(INIT_LOCK_BYTE)
+        logging.info(f"Shared cache mapped at {self.path}: {self.capacity} slots of {self.slot_size} bytes")
+
+    @classmethod
+    def from_config(cls, config, instance_path: str) -> "SharedCache":
+        return cls(
+            config.get('SHARED_CACHE_PATH') or os.path.join(instance_path, 'shared_cache.bin'),
+            config.get('SHARED_CACHE_CAPACITY', 2048),
+            config.get('SHARED_CACHE_KEY_SIZE', 128),
+            config.get('SHARED_CACHE_VALUE_SIZE', 4096),
+            config.get('SHARED_CACHE_TTL', 3600.0)
+        )
+
+    def _initialize_file(self) -> None:
+        # Workers started without --preload attach to the existing table instead of wiping it
+        expected_header = HEADER.pack(MAGIC, self.capacity, self.key_size, self.value_size)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        if os.fstat(self._fd).st_size == self.size and os.read(self._fd, HEADER.size) == expected_header:
+            return
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, self.size)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, expected_header)
+
+    def _process_lock(self, byte: int) -> None:
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, byte)
+
+    def _process_unlock(self, byte: int) -> None:
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, byte)
+
+    def _hash(self, key: bytes) -> int:
+        # 0 marks an empty slot hash, so real hashes are never 0
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") | 1
+
+    def _slot_offset(self, slot: int) -> int:
+        return TABLE_OFFSET + slot * self.slot_size
+
+    def _read_slot(self, offset: int, key_hash: int, key: bytes) -> tuple[bool, bytes | None, float]:
+        # Returns (stable, value, expires_at), value is None when the slot holds a different key
+        for _ in range(8):
+            version_before = VERSION.unpack_from(self._map, offset)[0]
+            if version_before & 1:
+                continue
+            _, state, slot_hash, expires_at, _, key_len, value_len = SLOT_HEADER.unpack_from(self._map, offset)
+            value = None
+            if state in OCCUPIED and slot_hash == key_hash and key_len == len(key):
+                key_start = offset + SLOT_HEADER.size
+                if self._map[key_start:key_start + key_len] == key:
+                    value_start = key_start + self.key_size
+                    value = self._map[value_start:value_start + value_len]
+            if VERSION.unpack_from(self._map, offset)[0] == version_before:
+                return True, value, expires_at
+        return False, None, 0.0
+
+    def get(self, key: str, default=None):
+        encoded_key = key.encode()
+        key_hash = self._hash(encoded_key)
+        bucket = key_hash % self.bucket_count
+        now = time.time()
+
+        for slot in range(bucket * BUCKET_SIZE, (bucket + 1) * BUCKET_SIZE):
+            offset = self._slot_offset(slot)
+            stable, value, expires_at = self._read_slot(offset, key_hash, encoded_key)
+            if not stable:
+                # A writer kept the slot busy, read it under the stripe lock instead
+                with self._stripe_lock(bucket):
+                    stable, value, expires_at = self._read_slot(offset, key_hash, encoded_key)
+            if value is None:
+                continue
+            if expires_at and expires_at < now:
+                break
+            # last_access is only an LRU hint, so it is updated without the lock
+            struct.pack_into("<d", self._map, offset + LAST_ACCESS_OFFSET, now)
+            self._count("hits")
+            return json.loads(value)
+
+        self._count("misses")
+        return default
+
+    def set(self, key: str, value, ttl: float = None, pinned: bool = False) -> bool:
+        # Returns False when the value was not stored: it is too large, or it is pinned and every slot of its bucket
+        # is already pinned
+        encoded_key = key.encode()
+        encoded_value = json.dumps(value, default=str).encode()
+        if len(encoded_key) > self.key_size or len(encoded_value) > self.value_size:
+            with self._counters_lock:
+                self._worker_stats["oversize"] += 1
+            return False
+
+        ttl = self.default_ttl if ttl is None else ttl
+        key_hash = self._hash(encoded_key)
+        bucket = key_hash % self.bucket_count
+        now = time.time()
+
+        with self._stripe_lock(bucket):
+            target, evicted = self._find_slot(bucket, key_hash, encoded_key, now)
+            if target is None:
+                return False
+            offset = self._slot_offset(target)
+            version = VERSION.unpack_from(self._map, offset)[0]
+            VERSION.pack_into(self._map, offset, (version + 1) & 0xFFFFFFFF)
+            SLOT_HEADER.pack_into(self._map, offset, (version + 1) & 0xFFFFFFFF, PINNED if pinned else USED, key_hash, now + ttl if ttl else 0.0, now, len(encoded_key), len(encoded_value))
+            key_start = offset + SLOT_HEADER.size
+            self._map[key_start:key_start + len(encoded_key)] = encoded_key
+            self._map[key_start + self.key_size:key_start + self.key_size + len(encoded_value)] = encoded_value
+            VERSION.pack_into(self._map, offset, (version + 2) & 0xFFFFFFFF)
+
+        self._count("sets")
+        if evicted:
+            self._count("evictions")
+        return True
+
+    def delete(self, key: str) -> bool:
+        encoded_key = key.encode()
+        key_hash = self._hash(encoded_key)
+        bucket = key_hash % self.bucket_count
+        with self._stripe_lock(bucket):
+            for slot in range(bucket * BUCKET_SIZE, (bucket + 1) * BUCKET_SIZE):
+                offset = self._slot_offset(slot)
+                if self._read_slot(offset, key_hash, encoded_key)[1] is not None:
+                    version = VERSION.unpack_from(self._map, offset)[0]
+                    VERSION.pack_into(self._map, offset, (version + 1) & 0xFFFFFFFF)
+                    SLOT_HEADER.pack_into(self._map, offset, (version + 1) & 0xFFFFFFFF, EMPTY, 0, 0.0, 0.0, 0, 0)
+                    VERSION.pack_into(self._map, offset, (version + 2) & 0xFFFFFFFF)
+                    return True
+        return False
+
+    def _find_slot(self, bucket: int, key_hash: int, key: bytes, now: float) -> tuple[int, bool]:
+        # Same key first, then an empty or expired slot, otherwise the least recently used slot that is not pinned
+        # is evicted. Returns None as the slot when every slot of the bucket is pinned.
+        free_slot = None
+        lru_slot, lru_access = None, None
+        for slot in range(bucket * BUCKET_SIZE, (bucket + 1) * BUCKET_SIZE):
+            offset = self._slot_offset(slot)
+            _, state, slot_hash, expires_at, last_access, key_len, _ = SLOT_HEADER.unpack_from(self._map, offset)
+            if state in OCCUPIED and slot_hash == key_hash and key_len == len(key):
+                key_start = offset + SLOT_HEADER.size
+                if self._map[key_start:key_start + key_len] == key:
+                    return slot, False
+            if free_slot is None and (state not in OCCUPIED or (expires_at and expires_at < now)):
+                free_slot = slot
+            if state != PINNED and (lru_access is None or last_access < lru_access):
+                lru_slot, lru_access = slot, last_access
+        if free_slot is not None:
+            return free_slot, False
+        return lru_slot, lru_slot is not None
+
+    def _stripe_lock(self, bucket: int) -> "_StripeLock":
+        return _StripeLock(self, bucket % LOCK_STRIPES)
+
+    def _count(self, name: str) -> None:
+        with self._counters_lock:
+            self._worker_stats[name] += 1
+            self._unflushed[COUNTER_NAMES.index(name)] += 1
+            self._unflushed_ops += 1
+            if self._unflushed_ops < self.stats_flush_every:
+                return
+            deltas, self._unflushed, self._unflushed_ops = self._unflushed, [0, 0, 0, 0], 0
+        self._add_to_global_counters(deltas)
+
+    def flush_stats(self) -> None:
+        with self._counters_lock:
+            deltas, self._unflushed, self._unflushed_ops = self._unflushed, [0, 0, 0, 0], 0
+        self._add_to_global_counters(deltas)
+
+    def _add_to_global_counters(self, deltas: list[int]) -> None:
+        # Global counters live in the file header and are updated in batches to keep lookups lock-free
+        if not any(deltas):
+            return
+        with self._global_counters_lock:
+            self._process_lock(COUNTERS_LOCK_BYTE)
+            try:
+                counters = COUNTERS.unpack_from(self._map, COUNTERS_OFFSET)
+                COUNTERS.pack_into(self._map, COUNTERS_OFFSET, *(total + delta for total, delta in zip(counters, deltas)))
+            finally:
+                self._process_unlock(COUNTERS_LOCK_BYTE)
+
+    def stats(self) -> dict[str, any]:
+        self.flush_stats()
+        hits, misses, sets, evictions = COUNTERS.unpack_from(self._map, COUNTERS_OFFSET)
+        with self._counters_lock:
+            worker_stats = dict(self._worker_stats)
+        worker_lookups = worker_stats["hits"] + worker_stats["misses"]
+        return {
+            "capacity": self.capacity,
+            "slot_size": self.slot_size,
+            "worker": dict(worker_stats, pid=os.getpid(), hit_rate=round(worker_stats["hits"] / worker_lookups, 4) if worker_lookups else None),
+            "global": {"hits": hits, "misses": misses, "sets": sets, "evictions": evictions,
+                       "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None}
+        }
+
+
+class _StripeLock:
+
+    def __init__(self, cache: SharedCache, stripe: int):
+        self.cache: SharedCache = cache
+        self.stripe: int = stripe
+
+    def __enter__(self):
+        self.cache._thread_locks[self.stripe].acquire()
+        try:
+            self.cache._process_lock(STRIPE_LOCK_BYTE + self.stripe)
+        except BaseException:
+            self.cache._thread_locks[self.stripe].release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cache._process_unlock(STRIPE_LOCK_BYTE + self.stripe)
+        self.cache._thread_locks[self.stripe].release()
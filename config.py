@@ -5,4 +5,51 @@ class Config:
     SUPABASE_URL = os.getenv('SUPABASE_URL') #or supabase_url
     SUPABASE_KEY = os.getenv('SUPABASE_KEY') #or supabase_key
     DEBUG = True
-    #DEBUG = False
\ No newline at end of file
+    #DEBUG = False
+
+    # Opt-in request profiling, see app/utils/profiler.py
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+    PROFILING_HEADER = os.getenv('PROFILING_HEADER', 'X-Profile-Request')
+    PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', '0.001'))
+    PROFILING_DIR = os.getenv('PROFILING_DIR')
+    PROFILING_RING_SIZE = int(os.getenv('PROFILING_RING_SIZE', '50'))
+    PROFILING_ADMIN_TOKEN = os.getenv('PROFILING_ADMIN_TOKEN')
+
+    # Exercise recommendations, see app/services/exercise_recommendations.py
+    EXERCISE_CATALOG_PATH = os.getenv('EXERCISE_CATALOG_PATH')
+    EXERCISE_PLAN_SIZE = int(os.getenv('EXERCISE_PLAN_SIZE', '5'))
+    EXERCISE_PLANS_ADMIN_TOKEN = os.getenv('EXERCISE_PLANS_ADMIN_TOKEN')
+    EXERCISE_PLANS_BATCH_SIZE = int(os.getenv('EXERCISE_PLANS_BATCH_SIZE', '200'))
+
+    # Supabase resilience, see app/services/db_resilience.py
+    DB_CALL_TIMEOUT = float(os.getenv('DB_CALL_TIMEOUT', '5'))
+    DB_BREAKER_FAILURE_THRESHOLD = int(os.getenv('DB_BREAKER_FAILURE_THRESHOLD', '5'))
+    DB_BREAKER_RESET_TIMEOUT = float(os.getenv('DB_BREAKER_RESET_TIMEOUT', '30'))
+    DB_JOURNAL_PATH = os.getenv('DB_JOURNAL_PATH')
+    DB_JOURNAL_MAX_ATTEMPTS = int(os.getenv('DB_JOURNAL_MAX_ATTEMPTS', '10'))
+    DB_REPLAY_INTERVAL = float(os.getenv('DB_REPLAY_INTERVAL', '10'))
+    DB_REPLAY_BATCH_SIZE = int(os.getenv('DB_REPLAY_BATCH_SIZE', '500'))
+
+    # /export/scores, see app/services/score_export.py
+    EXPORT_ADMIN_TOKEN = os.getenv('EXPORT_ADMIN_TOKEN')
+    EXPORT_MAX_PAGE_SIZE = int(os.getenv('EXPORT_MAX_PAGE_SIZE', '5000'))
+
+    # Scoring mode for /calculate_score: 'summary', or 'rasch'/'2pl' to add IRT abilities, see app/services/irt_scoring.py
+    SCORING_MODE = os.getenv('SCORING_MODE', 'summary')
+    # Each worker refits the item parameters in a background thread every IRT_MODEL_MAX_AGE / 2 seconds
+    IRT_MODEL_MAX_AGE = float(os.getenv('IRT_MODEL_MAX_AGE', '3600'))
+
+    # Cross-process cache, see app/utils/shared_cache.py
+    SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH')
+    SHARED_CACHE_CAPACITY = int(os.getenv('SHARED_CACHE_CAPACITY', '2048'))
+    SHARED_CACHE_KEY_SIZE = int(os.getenv('SHARED_CACHE_KEY_SIZE', '128'))
+    SHARED_CACHE_VALUE_SIZE = int(os.getenv('SHARED_CACHE_VALUE_SIZE', '4096'))
+    SHARED_CACHE_TTL = float(os.getenv('SHARED_CACHE_TTL', '3600'))
+    STORY_CACHE_TTL = float(os.getenv('STORY_CACHE_TTL', '3600'))
+    # /report/<user_id> returns a child's scores and plan, so it needs this token like the other admin endpoints
+    REPORT_ADMIN_TOKEN = os.getenv('REPORT_ADMIN_TOKEN')
+
+    # /generate_story: 'auto' calls gpt-4o and falls back to the local story engine, 'fast'/'offline' only use the local engine
+    STORY_MODE = os.getenv('STORY_MODE', 'auto')
+    STORY_UPSTREAM_TIMEOUT = float(os.getenv('STORY_UPSTREAM_TIMEOUT', '5'))
@@ -17,6 +17,7 @@ setup(
         'Flask==3.0.2',
         'Django==5.0.3',
         'configparser==6.0.1',
+        'numpy==1.26.4',
         'openai==1.30.1',
         'pandas==2.2.0',
         'pip==23.2.1',